@@ -23,290 +23,4709 @@ History
       files are not updated every time, Dec 2021, Matthias Cuntz
     * Allow more general use statements in Fortran files,
       Sep 2022, Matthias Cuntz
+    * Batch mode: write all outdated .d files in one call of make_d,
+      running the preprocessor from within the script, Oct 2026, Matthias Cuntz
+    * Persistent scan cache per source directory so that make.d.dict is
+      updated with only new or changed files rescanned,
+      Oct 2026, Matthias Cuntz
+    * Scan files in parallel processes using job slots of the GNU make
+      jobserver or option -j, Oct 2026, Matthias Cuntz
+    * One scanner for provided and used modules, submodules, and include
+      files; also recognises modules on lines with several statements,
+      Oct 2026, Matthias Cuntz
+    * Precompiled patterns and keyword prefilter on whole file for
+      faster scanning, Oct 2026, Matthias Cuntz
+    * DependencyGraph class; batch mode writes all dependencies into
+      one makefile make.d.mk, Oct 2026, Matthias Cuntz
+    * Firewall mode: object files depend on stamp files that change only
+      if module interfaces change, Oct 2026, Matthias Cuntz
+    * Submodules depend on their ancestor modules and parent submodules,
+      Oct 2026, Matthias Cuntz
+    * Include files are dependencies of object files, Oct 2026, Matthias Cuntz
+    * Evaluate pre-processor conditionals with definitions of -D instead
+      of running an external pre-processor, Oct 2026, Matthias Cuntz
+    * make_srcmap writes the source file of each object file into
+      a makefile, Oct 2026, Matthias Cuntz
+    * schedule sub-command with critical path, maximum useful -j, and
+      order of compilation, Oct 2026, Matthias Cuntz
+    * run and trace sub-commands record compile, dependency, and link
+      times and write Chrome trace and summary, Oct 2026, Matthias Cuntz
+    * objcache sub-command: content-addressed cache of object and module
+      files of Fortran files, Oct 2026, Matthias Cuntz
+    * check sub-command: summary and JUnit XML of the tests run in
+      parallel by make check, Oct 2026, Matthias Cuntz
+    * bench sub-command: synthetic Fortran projects and timings of
+      dependency generation and null builds, Oct 2026, Matthias Cuntz
+    * manifest sub-command writes the lists of files of the Makefile
+      only if they change, Oct 2026, Matthias Cuntz
+    * pgo sub-command copies the profiles of the training run of
+      release=pgo to the object files, Oct 2026, Matthias Cuntz
+    * Reverse dependency index and affected sub-command for files
+      recompiled and tests affected by changed files, Oct 2026, Matthias Cuntz
+    * Versioned binary module index per source directory instead of
+      make.d.dict, lazy lookup, error for duplicate modules,
+      Oct 2026, Matthias Cuntz
+    * watch sub-command keeps the dependency graph in memory and
+      rebuilds after changes of source files, Oct 2026, Matthias Cuntz
+    * make_srcmap sets flags of a per-file flag profile as target-specific
+      variables instead of the list INTEL_EXCLUDE_OBJS,
+      Oct 2026, Matthias Cuntz
+    * Scanner records main programs; make.d.mk lists object files not
+      needed by the main programs in MAKEDUNUSED, Oct 2026, Matthias Cuntz
+    * Scan cache rescans files whose include files changed,
+      Oct 2026, Matthias Cuntz
+    * Scan cache keeps records of several pre-processor settings,
+      Oct 2026, Matthias Cuntz
+    * watch rescans files including changed include files and continues
+      after errors such as duplicate modules, Oct 2026, Matthias Cuntz
+    * check sub-command exits with 1 if a test failed, Oct 2026, Matthias Cuntz
+    * affected sub-command uses the scan caches of the test builds,
+      Oct 2026, Matthias Cuntz
+    * mod_interface gets compiler families with compiler_family and
+      ignores the header of NAG module files, Oct 2026, Matthias Cuntz
+    * pgo sub-command handles the profiles of ifort, ifx, and PGI,
+      Oct 2026, Matthias Cuntz
 
 """
 
 
-__all__ = ['make_d']
+__all__ = ['make_d', 'make_srcmap', 'write_manifest', 'write_stamp',
+           'scan_files', 'cpp_filter', 'DependencyGraph', 'ModuleIndex',
+           'schedule', 'affected_files', 'affected_tests', 'run_traced',
+           'trace_report', 'check_report', 'objcache_compile',
+           'objcache_stats', 'bench', 'pgo_profiles', 'watch']
 
 
-def make_dict(modfile, srcfiles):
+import re
+
+
+# Name of scan cache file in each object directory
+CACHEFILE = 'make.d.cache'
+# Name of module index in each object directory
+MODINDEXFILE = 'make.d.modules'
+# Version of module index; change if content of index changes
+MODINDEXVERSION = 1
+# Name of makefile with all dependencies in first object directory
+DEPSFILE = 'make.d.mk'
+# Name of makefile with all dependencies in firewall mode
+FIREWALLFILE = 'make.d.firewall.mk'
+# Name of reverse dependency index in first object directory
+INDEXFILE = 'make.d.index.json'
+# Target-specific make variable with the flags of the flag profile
+FLAGSVAR = 'SRCFLAGS'
+# Families of compilers for sections of the flag profile
+FAMILIES = [('gnu', ('gnu',)), ('intel', ('intel', 'ifort', 'oneapi')),
+            ('nag', ('nag',)), ('pgi', ('pgi', 'pgfortran', 'nvfortran'))]
+# Version of scan cache; change if content of records changes
+CACHEVERSION = 6
+# Number of pre-processor settings kept in scan cache
+CACHEVARIANTS = 4
+# Minimum number of files to scan in parallel processes
+MINPARALLEL = 32
+
+# Only lines with one of these keywords can provide, use or include anything
+# or start a main program
+_KEYWORDS     = re.compile('use|module|include|program')
+_BKEYWORDS    = re.compile(b'use|module|include|program')
+# include statements
+_CPPINCLUDE   = re.compile(r'\s*#\s*include\s*["<]([^">]+)[">]')
+_INCLUDE      = re.compile(r'\s*include\s*["\']([^"\']+)["\']',
+                           re.IGNORECASE)
+# comments and strings
+_F90COMMENT   = re.compile('!.*$')
+_F77COMMENT   = re.compile('^c.*$')
+_DSTRING      = re.compile('".*?"')
+_SSTRING      = re.compile("'.*?'")
+# submodule (ancestor[:parent]) name
+_SUBMODULE    = re.compile(r'submodule\s*\(\s*(\w+)\s*(?::\s*(\w+)\s*)?'
+                           r'\)\s*(\w+)$')
+# use statements
+_NONINTRINSIC = re.compile(', *non_intrinsic')
+_AFTERCOMMA   = re.compile(',.*$')
+# pre-processor directives, possibly continued with backslash
+_CPPDIRECTIVE = re.compile(r'^[ \t]*#[ \t]*([a-z]*)((?:[^\n]*\\\n)*[^\n]*)',
+                           re.MULTILINE)
+_BCPPDIRECTIVE = re.compile(br'^[ \t]*#', re.MULTILINE)
+_CPPCOMMENT   = re.compile(r'/\*.*?\*/|//.*$')
+_CPPDEFINE    = re.compile(r'(\w+)(\([^)]*\))?\s*(.*)$')
+_CPPTOKEN     = re.compile(r'0[xX][0-9a-fA-F]+[uUlL]*|\d+[uUlL]*|\w+|&&|'
+                           r'\|\||<<|>>|<=|>=|==|!=|[-+*/%()<>!~&|^?:]')
+# binary operators of #if expressions and their precedence
+_CPPBINARY    = {'||': 1, '&&': 2, '|': 3, '^': 4, '&': 5,
+                 '==': 6, '!=': 6, '<': 7, '>': 7, '<=': 7, '>=': 7,
+                 '<<': 8, '>>': 8, '+': 9, '-': 9, '*': 10, '/': 10, '%': 10}
+_CPPUNARY     = ('(', ')', '!', '~', '-', '+', '?', ':')
+
+
+def keyword_lines(text):
+    """
+    Lines of Fortran code that contain a keyword use, module, include,
+    or program
+
+    All other lines cannot provide, use or include anything, or start
+    a main program. The keywords
+    are searched in the lower-cased whole text at once, which is much
+    faster than treating every line in Python.
+
+    Parameters
+    ----------
+    text : str or bytes
+        Content of Fortran file
+
+    Returns
+    -------
+    generator of str
+        Lines containing one of the keywords, in any case
+
+    """
+    if isinstance(text, type(u'')):
+        keywords = _KEYWORDS
+        nl = u'\n'
+        binary = False
+    else:
+        keywords = _BKEYWORDS
+        nl = b'\n'
+        binary = True
+    # ascii only so that positions are the same in lower-cased text
+    low = text.lower()
+    ntext = len(low)
+    pos = 0
+    while pos < ntext:
+        mm = keywords.search(low, pos)
+        if mm is None:
+            break
+        start = low.rfind(nl, 0, mm.start()) + 1
+        end   = low.find(nl, mm.end())
+        if end < 0:
+            end = ntext
+        if binary:
+            yield text[start:end].decode('ascii', 'ignore')
+        else:
+            yield text[start:end]
+        pos = end + 1
+
+
+def scan_fortran(text):
+    """
+    Modules provided and used, submodules, include files, and main
+    programs in Fortran code
+
+    Parameters
+    ----------
+    text : str or bytes
+        Content of Fortran file; bytes are taken as ascii
+
+    Returns
+    -------
+    dict
+        Record with the keys
+        'provides': list of modules provided,
+        'uses': list of modules used (without intrinsic modules),
+        'submodules': list of submodules as [name, ancestor, parent],
+        parent is None if the parent is the ancestor module, and
+        'includes': list of files included with Fortran include or
+        pre-processor #include statements, and
+        'programs': list of main programs.
+
+    Notes
+    -----
+    Script assumes that the keyword 'module' and the module name are on the
+    same line in the Fortran files. That means it does not allow to start a
+    Fortran90 module like this:
+    .. code-block:: f90
+
+        module &
+            mo_name ! this is a weird coding style
+
+    """
+    provides   = list()
+    uses       = list()
+    submodules = list()
+    includes   = list()
+    programs   = list()
+    # Go through lines with keywords.
+    # Look for include statements, then
+    # remove comments and strings because the latter can include ';'.
+    # Then split at at ';', if given.
+    for line in keyword_lines(text):
+        # include 'file' or #include "file"
+        inc = _CPPINCLUDE.match(line)
+        if inc is None:
+            inc = _INCLUDE.match(line)
+        if inc is not None:
+            includes.append(inc.group(1))
+            continue
+        ll = line.rstrip().lower()    # everything lower case
+        ll = _F90COMMENT.sub('', ll)  # remove F90 comment
+        ll = _F77COMMENT.sub('', ll)  # remove F77 comments
+        ll = _DSTRING.sub('', ll)     # remove "string"
+        ll = _SSTRING.sub('', ll)     # remove 'string'
+        # check if several commands are on one line
+        if ';' in ll:
+            lll = ll.split(';')
+        else:
+            lll = [ll]
+        for il in lll:
+            iil = il.strip()
+            # The stripped line should start with 'module ' and there
+            # should be nothing after the module name,
+            # as for example in lines such as 'module procedure ...'
+            if iil.startswith('module '):
+                imod = iil[7:].strip()      # remove 'module '
+                if len(imod.split()) == 1:  # not 'module procedure'
+                    provides.append(imod)
+            # submodule (ancestor[:parent]) name
+            elif iil.startswith('submodule'):
+                sub = _SUBMODULE.match(iil)
+                if sub is not None:
+                    submodules.append([sub.group(3), sub.group(1),
+                                       sub.group(2)])
+            # program name, not 'end program name'
+            elif iil.startswith('program '):
+                iprog = iil[8:].strip()
+                if len(iprog.split()) == 1:
+                    programs.append(iprog)
+            # The stripped line should start with 'use '.
+            # After use should be the "module_name",
+            # ', intrinsic :: module_name', or
+            # ', non_intrinsic :: module_name'.
+            # We allow also to use ":: module_name"
+            # After module name should only be ', only: ...' or ', a ==> b'
+            elif iil.startswith('use '):
+                iil = iil[4:].strip()  # remove 'use '
+                # skip intrinsic modules
+                if 'intrinsic' in iil:
+                    if 'non_intrinsic' in iil:
+                        iil = _NONINTRINSIC.sub('', iil)
+                        iil = iil.strip()
+                    else:
+                        continue  # skip to next in lll
+                if iil.startswith('::'):
+                    iil = iil[2:].strip()  # remove ':: '
+                # remove after ',' if rename-list or only-list
+                iil = _AFTERCOMMA.sub('', iil)
+                uses.append(iil.strip())
+
+    return {'provides': provides, 'uses': uses, 'submodules': submodules,
+            'includes': includes, 'programs': programs}
+
+
+def read_fortran(ffile):
+    """
+    Content of Fortran file ignoring non-ascii characters
+
+    Parameters
+    ----------
+    ffile : str
+        Fortran file name
+
+    Returns
+    -------
+    str
+        Content of `ffile`
+
+    """
+    fi = open(ffile, 'rb')
+    data = fi.read()
+    fi.close()
+
+    return data.decode('ascii', 'ignore')
+
+
+def write_if_changed(ofile, otext):
+    """
+    Write text to file only if the file content changes
+
+    Parameters
+    ----------
+    ofile : str
+        Output filename
+    otext : str
+        Text to write into `ofile`
+
+    Returns
+    -------
+    bool
+        True if `ofile` was written
+
+    """
+    import os
+    import codecs
+
+    if os.path.exists(ofile):
+        of = codecs.open(ofile, 'r', encoding='utf-8')
+        itext = of.read()
+        of.close()
+        if itext == otext:
+            return False
+    of = codecs.open(ofile, 'w', encoding='utf-8')
+    of.write(otext)
+    of.close()
+
+    return True
+
+
+def record_provides(record):
+    """
+    Modules and submodules provided by one scanned Fortran90 file
+
+    Submodules are given as ancestor@name such as their .smod files.
+
+    Parameters
+    ----------
+    record : dict
+        Record of scan_fortran or scan_file
+
+    Returns
+    -------
+    List of modules and submodules provided
+
+    """
+    return record['provides'] + [ ss[1] + '@' + ss[0]
+                                  for ss in record['submodules'] ]
+
+
+def record_uses(record):
+    """
+    Modules and submodules needed by one scanned Fortran90 file
+
+    A submodule needs its ancestor module and its parent submodule,
+    given as ancestor@parent such as its .smod file.
+
+    Parameters
+    ----------
+    record : dict
+        Record of scan_fortran or scan_file
+
+    Returns
+    -------
+    List of modules and submodules used
+
+    """
+    uses = list(record['uses'])
+    for ss in record['submodules']:
+        uses.append(ss[1])
+        if ss[2]:
+            uses.append(ss[1] + '@' + ss[2])
+
+    return uses
+
+
+def provided_mods(ffile, text=None):
+    """
+    List of modules provided by one Fortran90 file
+
+    Submodules are given as ancestor@name.
+
+    Parameters
+    ----------
+    ffile : str
+        Fortran90 file name
+    text : str, optional
+        Content of `ffile`.
+        `ffile` will not be read if `text` is given.
+
+    Returns
+    -------
+    List of modules provided by `ffile`
+
+    """
+    if text is None:
+        text = read_fortran(ffile)
+
+    return record_provides(scan_fortran(text))
+
+
+def duplicate_modules(srcfiles, mods):
+    """
+    Modules provided by more than one Fortran file
+
+    Parameters
+    ----------
+    srcfiles : list of str
+        Fortran files
+    mods : list of lists
+        Modules provided by each file of `srcfiles`
+
+    Returns
+    -------
+    str
+        Message with one line per module and the files providing it,
+        empty if each module is provided by one file only
+
+    """
+    from collections import OrderedDict
+
+    providers = OrderedDict()
+    for ff, olist in zip(srcfiles, mods):
+        for mm in olist:
+            providers.setdefault(mm, list())
+            if ff not in providers[mm]:
+                providers[mm].append(ff)
+
+    return '\n'.join([ '    ' + mm + ': ' + ' '.join(providers[mm])
+                       for mm in providers if len(providers[mm]) > 1 ])
+
+
+def read_modindex(indexfile):
+    """
+    Read module index of one source directory written by make_dict
+
+    Parameters
+    ----------
+    indexfile : str
+        Module index file
+
+    Returns
+    -------
+    dict
+        Dictionary with module names as keys and filenames as values.
+        Empty dictionary if `indexfile` does not exist or has another
+        version.
+
+    """
+    import os
+    import pickle
+
+    if not os.path.exists(indexfile):
+        return dict()
+    try:
+        fi = open(indexfile, 'rb')
+        index = pickle.load(fi)
+        fi.close()
+    except (IOError, EOFError, ValueError, pickle.UnpicklingError):
+        return dict()
+    if (not isinstance(index, dict) or
+        (index.get('version') != MODINDEXVERSION)):
+        return dict()
+
+    return index.get('modules', dict())
+
+
+class ModuleIndex(object):
+    """
+    Lazy lookup of modules in the module indexes of source directories
+
+    The index files are only read when a module is not found in the
+    indexes read so far. Modules are searched in the order of the index
+    files.
+
+    Parameters
+    ----------
+    indexfiles : list of str
+        Module index files of make_dict, one per source directory
+
+    Examples
+    --------
+    >>> index = ModuleIndex(['src/.gnu.release/make.d.modules',
+    ...                      'lib/.gnu.release/make.d.modules'])
+    >>> if 'mo_kind' in index:
+    ...     print(index['mo_kind'])
+    >>> moddict = index.merged()
+
+    """
+
+    def __init__(self, indexfiles):
+        if not isinstance(indexfiles, (list, tuple)):
+            indexfiles = [indexfiles]
+        self.indexfiles = list(indexfiles)
+        self.indexes    = list()
+
+    def _lookup(self, mod):
+        for index in self.indexes:
+            if mod in index:
+                return index[mod]
+        while len(self.indexes) < len(self.indexfiles):
+            index = read_modindex(self.indexfiles[len(self.indexes)])
+            self.indexes.append(index)
+            if mod in index:
+                return index[mod]
+        return None
+
+    def __contains__(self, mod):
+        return self._lookup(mod) is not None
+
+    def __getitem__(self, mod):
+        ff = self._lookup(mod)
+        if ff is None:
+            raise KeyError(mod)
+        return ff
+
+    def get(self, mod, default=None):
+        """
+        File providing module `mod` or `default` if not found
+        """
+        ff = self._lookup(mod)
+        return default if ff is None else ff
+
+    def merged(self):
+        """
+        Dictionary of all modules of all index files
+
+        Raises
+        ------
+        ValueError
+            If a module is provided by files in more than one index
+        """
+        while len(self.indexes) < len(self.indexfiles):
+            self.indexes.append(
+                read_modindex(self.indexfiles[len(self.indexes)]))
+        files = list()
+        mods  = list()
+        for index in self.indexes:
+            for mm in sorted(index):
+                files.append(index[mm])
+                mods.append([mm])
+        dups = duplicate_modules(files, mods)
+        if dups:
+            raise ValueError('Modules provided by more than one file:\n'
+                             + dups)
+        return dict(zip([ mm[0] for mm in mods ], files))
+
+
+def make_dict(opath, srcfiles, records=None, njobs=1):
+    """
+    Index of the modules provided by the Fortran files
+
+    Writes a module index dirname(ffile)/opath/make.d.modules per source
+    directory with a versioned dictionary of module names and the files
+    providing them, read quickly by read_modindex and ModuleIndex.
+    The files are only written if their content changes.
+
+    Parameters
+    ----------
+    opath : str
+        Relative output directory.
+        Script assumes compilation into dirname(ffile)/opath
+    srcfiles : list of str
+        List with Fortran90 files
+    records : dict, optional
+        Records of scan_files with Fortran90 files as keys.
+        Files will be scanned with provided_mods if not given.
+    njobs : int, optional
+        Number of parallel processes for scanning if not called by make
+        with a jobserver
+
+    Returns
+    -------
+    list of str
+        Module index files in the order of the source directories
+
+    Raises
+    ------
+    ValueError
+        If a module is provided by more than one file
+
+    """
+    import os
+    import pickle
+
+    if records is None:
+        mods = parallel_map(provided_mods, srcfiles, njobs=njobs)
+    else:
+        mods = [ record_provides(records[ff]) for ff in srcfiles ]
+    dups = duplicate_modules(srcfiles, mods)
+    if dups:
+        raise ValueError('Modules provided by more than one file:\n' + dups)
+
+    indexes = dict()
+    indexfiles = list()
+    for ff in srcfiles:
+        ifile = os.path.dirname(ff) + '/' + opath + '/' + MODINDEXFILE
+        if ifile not in indexes:
+            indexes[ifile] = dict()
+            indexfiles.append(ifile)
+    for ff, olist in zip(srcfiles, mods):
+        ifile = os.path.dirname(ff) + '/' + opath + '/' + MODINDEXFILE
+        for mm in olist:
+            indexes[ifile][mm] = ff
+    for ifile in indexfiles:
+        if read_modindex(ifile) == indexes[ifile]:
+            continue
+        if not os.path.exists(os.path.dirname(ifile)):
+            os.makedirs(os.path.dirname(ifile))
+        # write to temporary file first so that an interrupted write
+        # does not leave a corrupt index
+        tfile = ifile + '.tmp'
+        fo = open(tfile, 'wb')
+        pickle.dump({'version': MODINDEXVERSION, 'modules': indexes[ifile]},
+                    fo, 2)
+        fo.close()
+        os.rename(tfile, ifile)
+
+    return indexfiles
+
+
+def get_dict(indexfiles, records=None, srcfiles=None):
+    """
+    Modules and the files providing them
+
+    Parameters
+    ----------
+    indexfiles : list of str
+        Module index files of make_dict
+    records : dict, optional
+        Records of scan_files with Fortran90 files as keys.
+        The dictionary is made from the records instead of `indexfiles`
+        if given.
+    srcfiles : list of str, optional
+        Order of files in `records`, later files overwrite modules of
+        earlier files. Default: keys of `records`
+
+    Returns
+    -------
+    dict or ModuleIndex
+        Dictionary with module names as keys and filenames as values,
+        e.g. dict['mo_kind'] = '/path/mo_kind.f90',
+        or ModuleIndex of `indexfiles` if `records` is not given
+
+    """
+    if records is not None:
+        odict = dict()
+        if srcfiles is None:
+            srcfiles = list(records.keys())
+        for ff in srcfiles:
+            for m in record_provides(records[ff]):
+                odict[m] = ff
+        return odict
+
+    return ModuleIndex(indexfiles)
+
+
+def used_mods(ffile, text=None):
+    """
+    List of modules used in one Fortran90 file
+
+    The ancestor module and parent submodule of submodules are included.
+
+    Parameters
+    ----------
+    ffile : str
+        Fortran90 file name
+    text : str, optional
+        Content of `ffile`, e.g. after pre-processing.
+        `ffile` will not be read if `text` is given.
+
+    Returns
+    -------
+    List of modules used in `ffile`
+
+    """
+    if text is None:
+        text = read_fortran(ffile)
+
+    return record_uses(scan_fortran(text))
+
+
+def preprocess(cpp, ffile):
+    """
+    Pre-process one Fortran file
+
+    Parameters
+    ----------
+    cpp : str
+        Pre-processor command including flags such as
+        '/usr/bin/cpp -C -P -DNAME -I/path'.
+        The filename will be appended.
+    ffile : str
+        Fortran file name
+
+    Returns
+    -------
+    str or None
+        Pre-processed content of `ffile`, None if the pre-processor failed
+        or gave no output
+
+    """
+    import shlex
+    import subprocess
+
+    try:
+        pp = subprocess.Popen(shlex.split(cpp) + [ffile],
+                              stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    except OSError:
+        return None
+    out, err = pp.communicate()
+    if not out:
+        return None
+
+    return out.decode('ascii', 'ignore')
+
+
+def cpp_defines(defines):
+    """
+    Dictionary of macros from pre-processor definitions
+
+    Parameters
+    ----------
+    defines : list of str
+        Definitions such as given with -D to the compiler,
+        e.g. ['__GFORTRAN__', 'NDIM=3']
+
+    Returns
+    -------
+    dict
+        Macro names as keys and their values, e.g.
+        {'__GFORTRAN__': '1', 'NDIM': '3'}
+
+    """
+    macros = dict()
+    for dd in defines:
+        if '=' in dd:
+            name, value = dd.split('=', 1)
+        else:
+            name, value = dd, '1'
+        macros[name.strip()] = value.strip()
+
+    return macros
+
+
+def _cpp_tokens(expr, macros, seen):
+    """
+    Tokens of #if expression with macros and defined() replaced by numbers
+    """
+    raw = _CPPTOKEN.findall(expr)
+    if ''.join(raw) != ''.join(expr.split()):
+        raise ValueError('Unknown characters in: ' + expr)
+    tokens = list()
+    ii = 0
+    while ii < len(raw):
+        tt = raw[ii]
+        if tt == 'defined':
+            if raw[ii + 1] == '(':
+                if raw[ii + 3] != ')':
+                    raise ValueError('Missing ) in: ' + expr)
+                name = raw[ii + 2]
+                ii += 4
+            else:
+                name = raw[ii + 1]
+                ii += 2
+            tokens.append(int(name in macros))
+            continue
+        if tt[0].isdigit():
+            tt = tt.rstrip('uUlL')
+            if tt[:2] in ['0x', '0X']:
+                tokens.append(int(tt, 16))
+            elif tt.startswith('0') and (len(tt) > 1):
+                tokens.append(int(tt, 8))
+            else:
+                tokens.append(int(tt))
+        elif (tt[0].isalpha() or (tt[0] == '_')):
+            # undefined identifiers are 0
+            if (tt in macros) and (tt not in seen):
+                if macros[tt] is None:
+                    raise ValueError('Function-like macro ' + tt)
+                tokens.extend(_cpp_tokens(macros[tt], macros, seen | set([tt])))
+            else:
+                tokens.append(0)
+        else:
+            tokens.append(tt)
+        ii += 1
+
+    return tokens
+
+
+def _cpp_ternary(tokens, pos):
+    """
+    Parse conditional expression a ? b : c starting at tokens[pos]
+    """
+    pos, cond = _cpp_binary(tokens, pos, 1)
+    if (pos < len(tokens)) and (tokens[pos] == '?'):
+        pos, aa = _cpp_ternary(tokens, pos + 1)
+        if (pos >= len(tokens)) or (tokens[pos] != ':'):
+            raise ValueError('Missing : in conditional expression')
+        pos, bb = _cpp_ternary(tokens, pos + 1)
+        return pos, (aa if cond else bb)
+
+    return pos, cond
+
+
+def _cpp_binary(tokens, pos, minprec):
+    """
+    Parse binary operators with precedence >= minprec starting at
+    tokens[pos]
+    """
+    pos, lhs = _cpp_unary(tokens, pos)
+    while ( (pos < len(tokens)) and (tokens[pos] in _CPPBINARY) and
+            (_CPPBINARY[tokens[pos]] >= minprec) ):
+        op = tokens[pos]
+        pos, rhs = _cpp_binary(tokens, pos + 1, _CPPBINARY[op] + 1)
+        if op == '||':
+            lhs = int(bool(lhs) or bool(rhs))
+        elif op == '&&':
+            lhs = int(bool(lhs) and bool(rhs))
+        elif op == '|':
+            lhs = lhs | rhs
+        elif op == '^':
+            lhs = lhs ^ rhs
+        elif op == '&':
+            lhs = lhs & rhs
+        elif op == '==':
+            lhs = int(lhs == rhs)
+        elif op == '!=':
+            lhs = int(lhs != rhs)
+        elif op == '<':
+            lhs = int(lhs < rhs)
+        elif op == '>':
+            lhs = int(lhs > rhs)
+        elif op == '<=':
+            lhs = int(lhs <= rhs)
+        elif op == '>=':
+            lhs = int(lhs >= rhs)
+        elif op == '<<':
+            lhs = lhs << rhs
+        elif op == '>>':
+            lhs = lhs >> rhs
+        elif op == '+':
+            lhs = lhs + rhs
+        elif op == '-':
+            lhs = lhs - rhs
+        elif op == '*':
+            lhs = lhs * rhs
+        else:
+            # integer division and remainder truncate towards zero as in C
+            quot = abs(lhs) // abs(rhs)
+            if (lhs < 0) != (rhs < 0):
+                quot = -quot
+            if op == '/':
+                lhs = quot
+            else:
+                lhs = lhs - rhs * quot
+
+    return pos, lhs
+
+
+def _cpp_unary(tokens, pos):
+    """
+    Parse number, unary operator or parenthesis starting at tokens[pos]
+    """
+    tt = tokens[pos]
+    if tt == '(':
+        pos, val = _cpp_ternary(tokens, pos + 1)
+        if (pos >= len(tokens)) or (tokens[pos] != ')'):
+            raise ValueError('Missing )')
+        return pos + 1, val
+    elif tt == '!':
+        pos, val = _cpp_unary(tokens, pos + 1)
+        return pos, int(not val)
+    elif tt == '~':
+        pos, val = _cpp_unary(tokens, pos + 1)
+        return pos, ~val
+    elif tt == '-':
+        pos, val = _cpp_unary(tokens, pos + 1)
+        return pos, -val
+    elif tt == '+':
+        return _cpp_unary(tokens, pos + 1)
+    elif (tt in _CPPBINARY) or (tt in _CPPUNARY):
+        raise ValueError('Unexpected operator ' + tt)
+
+    return pos + 1, tt
+
+
+def cpp_expression(expr, macros):
+    """
+    Evaluate the expression of an #if or #elif directive
+
+    Parameters
+    ----------
+    expr : str
+        Expression such as 'defined(__GFORTRAN__) && (NDIM > 2)'
+    macros : dict
+        Defined macros and their values such as given by cpp_defines;
+        the value of function-like macros is None
+
+    Returns
+    -------
+    int or None
+        Value of the expression, None if it cannot be evaluated,
+        e.g. with function-like macros
+
+    Examples
+    --------
+    >>> cpp_expression('defined(A) && (B > 2)', {'A': '1', 'B': '3'})
+    1
+
+    """
+    try:
+        tokens = _cpp_tokens(expr, macros, set())
+        pos, val = _cpp_ternary(tokens, 0)
+    except (ValueError, IndexError, ZeroDivisionError):
+        return None
+    if pos != len(tokens):
+        return None
+
+    return val
+
+
+def _cpp_branch(cond, state):
+    """
+    Activity of a branch of #if, #elif, #else with condition `cond`
+    if previous branches were taken (1), not taken (0), or unknown (None)
+    """
+    if state == 1:
+        return False, 1
+    if cond is None:
+        return True, None
+    if cond:
+        return True, 1
+
+    return False, state
+
+
+def cpp_filter(text, macros, incdirs=None, ffile=None, depth=0):
+    """
+    Remove code that is inactive because of pre-processor conditionals
+
+    Evaluates #if, #ifdef, #ifndef, #elif, #else, #endif, #define, and
+    #undef, as well as #include of files that can be found.
+    Conditions that cannot be evaluated are taken as true for the branch
+    and all later branches so that no used module is missed.
+
+    Parameters
+    ----------
+    text : str
+        Content of Fortran file
+    macros : dict
+        Defined macros and their values such as given by cpp_defines;
+        updated in place by #define and #undef
+    incdirs : list of str, optional
+        Directories to search for #include files
+    ffile : str, optional
+        Name of the Fortran file; #include files are searched first in its
+        directory
+    depth : int, optional
+        Nesting level of #include files
+
+    Returns
+    -------
+    str
+        Active code and #include directives of `text`
+
+    """
+    import os
+
+    if incdirs is None:
+        incdirs = []
+    out    = list()
+    stack  = list()
+    active = True
+    state  = 1
+    pos    = 0
+    for mm in _CPPDIRECTIVE.finditer(text):
+        if active:
+            out.append(text[pos:mm.start()])
+        pos  = mm.end()
+        name = mm.group(1)
+        arg  = _CPPCOMMENT.sub('', mm.group(2).replace('\\\n', ' ')).strip()
+        if name in ['if', 'ifdef', 'ifndef']:
+            stack.append((active, state))
+            if name == 'if':
+                cond = cpp_expression(arg, macros)
+            elif name == 'ifdef':
+                cond = arg.split()[0] in macros if arg else None
+            else:
+                cond = arg.split()[0] not in macros if arg else None
+            if active:
+                active, state = _cpp_branch(cond, 0)
+            else:
+                state = 1
+        elif name in ['elif', 'else']:
+            if stack and stack[-1][0]:
+                if name == 'elif':
+                    if state == 1:
+                        cond = 0  # not evaluated
+                    else:
+                        cond = cpp_expression(arg, macros)
+                else:
+                    cond = 1
+                active, state = _cpp_branch(cond, state)
+        elif name == 'endif':
+            if stack:
+                active, state = stack.pop()
+        elif not active:
+            continue
+        elif name == 'define':
+            dd = _CPPDEFINE.match(arg)
+            if dd is not None:
+                # function-like macros cannot be evaluated
+                macros[dd.group(1)] = None if dd.group(2) else dd.group(3)
+        elif name == 'undef':
+            if arg:
+                macros.pop(arg.split()[0], None)
+        elif name == 'include':
+            if depth == 0:
+                out.append(mm.group(0))
+            inc = arg.strip('"<>')
+            idirs = list(incdirs)
+            if ffile:
+                idirs.insert(0, os.path.dirname(ffile))
+            for dd in idirs:
+                iinc = os.path.join(dd, inc)
+                if os.path.isfile(iinc):
+                    if depth < 16:
+                        out.append('\n')
+                        out.append(cpp_filter(read_fortran(iinc), macros,
+                                              incdirs=incdirs, ffile=iinc,
+                                              depth=depth + 1))
+                    break
+    if active:
+        out.append(text[pos:])
+
+    return ''.join(out)
+
+
+def _read_variants(cfile):
+    """
+    Scan records of all pre-processor settings in a scan cache file
+
+    Returns the list of {'cpp', 'defines', 'files'}, most recently
+    written first; empty if `cfile` does not exist or cannot be used.
+    """
+    import os
+    import json
+    import codecs
+
+    if not os.path.exists(cfile):
+        return list()
+    try:
+        cf = codecs.open(cfile, 'r', encoding='utf-8')
+        cache = json.load(cf)
+        cf.close()
+    except (IOError, ValueError):
+        return list()
+    if cache.get('version') != CACHEVERSION:
+        return list()
+
+    return cache.get('variants', list())
+
+
+def read_cache(cfile, cpp=None, defines=None):
+    """
+    Read scan cache of one source directory
+
+    The cache keeps the records of the last CACHEVARIANTS pre-processor
+    settings so that calls with different settings, such as make.d.py
+    with and without -D, do not discard each other's records.
+
+    Parameters
+    ----------
+    cfile : str
+        Cache file written by write_cache
+    cpp : str, optional
+        Pre-processor command used for scanning for used modules
+    defines : dict, optional
+        Macros used for evaluating pre-processor conditionals
+
+    Returns
+    -------
+    dict
+        Dictionary with Fortran files as keys and records as values
+        scanned with `cpp` and `defines`.
+        Records are dictionaries of scan_file.
+        Empty dictionary if `cfile` does not exist, cannot be used, or
+        has no records of these settings.
+
+    """
+    for vv in _read_variants(cfile):
+        if (vv.get('cpp') == cpp) and (vv.get('defines') == defines):
+            return vv.get('files', dict())
+
+    return dict()
+
+
+def write_cache(cfile, records, cpp=None, defines=None):
+    """
+    Write scan cache of one source directory
+
+    The records replace the records of the same pre-processor settings;
+    records of other settings are kept, at most CACHEVARIANTS in total.
+
+    Parameters
+    ----------
+    cfile : str
+        Output cache file
+    records : dict
+        Dictionary with Fortran files as keys and records as values,
+        see read_cache
+    cpp : str, optional
+        Pre-processor command used for scanning for used modules
+    defines : dict, optional
+        Macros used for evaluating pre-processor conditionals
+
+    Returns
+    -------
+    JSON file `cfile`
+
+    """
+    import os
+    import json
+    import codecs
+
+    if not os.path.exists(os.path.dirname(cfile)):
+        os.makedirs(os.path.dirname(cfile))
+    variants = [ vv for vv in _read_variants(cfile)
+                 if (vv.get('cpp') != cpp) or (vv.get('defines') != defines) ]
+    variants.insert(0, {'cpp': cpp, 'defines': defines, 'files': records})
+    cache = {'version': CACHEVERSION, 'variants': variants[:CACHEVARIANTS]}
+    # write to temporary file first so that an interrupted write
+    # does not leave a corrupt cache
+    tfile = cfile + '.tmp'
+    cf = codecs.open(tfile, 'w', encoding='utf-8')
+    json.dump(cache, cf, sort_keys=True)
+    cf.close()
+    os.rename(tfile, cfile)
+
+    return
+
+
+class JobServer(object):
+    """
+    Client of the GNU make jobserver
+
+    Takes job slots from the jobserver of a calling GNU make given in the
+    environment variable MAKEFLAGS and gives them back after use.
+    The command must be marked recursive in the Makefile (leading '+') so
+    that make passes the jobserver to it.
+
+    Parameters
+    ----------
+    makeflags : str, optional
+        Flags of calling make. Default: environment variable MAKEFLAGS.
+
+    Examples
+    --------
+    >>> js = JobServer()
+    >>> njobs = 1 + js.acquire(7)
+    >>> # do work with njobs processes
+    >>> js.release()
+
+    """
+
+    def __init__(self, makeflags=None):
+        import os
+        import stat
+
+        if makeflags is None:
+            makeflags = os.environ.get('MAKEFLAGS', '')
+        self.rfd = None
+        self.wfd = None
+        self.tokens = list()
+        self.ownfds = False
+        auth = None
+        for ff in makeflags.split():
+            if ( ff.startswith('--jobserver-auth=') or
+                 ff.startswith('--jobserver-fds=') ):
+                auth = ff.split('=', 1)[1]
+        if auth is None:
+            return
+        try:
+            if auth.startswith('fifo:'):
+                # GNU make >= 4.4
+                rfd = os.open(auth[5:], os.O_RDWR | os.O_NONBLOCK)
+                self.rfd = rfd
+                self.wfd = rfd
+                self.ownfds = True
+            else:
+                rfd, wfd = [ int(ii) for ii in auth.split(',') ]
+                # fds closed if command not marked recursive in Makefile
+                if ( stat.S_ISFIFO(os.fstat(rfd).st_mode) and
+                     stat.S_ISFIFO(os.fstat(wfd).st_mode) ):
+                    self.rfd = rfd
+                    self.wfd = wfd
+        except (OSError, ValueError):
+            self.rfd = None
+            self.wfd = None
+
+    def acquire(self, njobs):
+        """
+        Take up to `njobs` free job slots without waiting
+
+        Parameters
+        ----------
+        njobs : int
+            Maximum number of job slots to take
+
+        Returns
+        -------
+        int
+            Number of job slots taken in addition to the slot that the
+            calling make reserved for this process
+
+        """
+        import os
+        import select
+
+        if self.rfd is None:
+            return 0
+        nn = 0
+        while nn < njobs:
+            try:
+                rr = select.select([self.rfd], [], [], 0)[0]
+                if not rr:
+                    break
+                token = os.read(self.rfd, 1)
+            except (OSError, IOError):
+                break
+            if not token:
+                break
+            self.tokens.append(token)
+            nn += 1
+
+        return nn
+
+    def release(self):
+        """
+        Give back all job slots taken with acquire
+
+        """
+        import os
+
+        while self.tokens:
+            token = self.tokens.pop()
+            try:
+                os.write(self.wfd, token)
+            except (OSError, IOError):
+                pass
+        if self.ownfds and (self.rfd is not None):
+            os.close(self.rfd)
+            self.rfd = None
+            self.wfd = None
+
+
+def parallel_map(func, args, njobs=1):
+    """
+    Map function on list of arguments, possibly in parallel processes
+
+    Job slots are taken from the jobserver of a calling GNU make.
+    If there is no jobserver, `njobs` processes are used.
+
+    Parameters
+    ----------
+    func : callable
+        Function of one argument, defined at module level
+    args : list
+        List of arguments
+    njobs : int, optional
+        Number of parallel processes if there is no make jobserver.
+        Default: 1, i.e. serial.
+
+    Returns
+    -------
+    list
+        [func(arg) for arg in args]
+
+    """
+    import multiprocessing
+
+    if len(args) < MINPARALLEL:
+        return [ func(aa) for aa in args ]
+
+    try:
+        ncpu = multiprocessing.cpu_count()
+    except NotImplementedError:
+        ncpu = 1
+    nmax = min(ncpu, len(args) // (MINPARALLEL // 2))
+    js = JobServer()
+    if js.rfd is not None:
+        # one implicit job slot for this process
+        nproc = 1 + js.acquire(nmax - 1)
+    else:
+        nproc = min(max(njobs, 1), nmax)
+    try:
+        if nproc <= 1:
+            return [ func(aa) for aa in args ]
+        pool = multiprocessing.Pool(nproc)
+        try:
+            chunk = max(1, len(args) // (4 * nproc))
+            out = pool.map(func, args, chunk)
+        finally:
+            pool.close()
+            pool.join()
+    finally:
+        js.release()
+
+    return out
+
+
+def _scan_file_args(args):
+    """
+    scan_file with arguments (ffile, cpp, defines, incdirs) for parallel_map
+    """
+    return scan_file(*args)
+
+
+def include_stats(incfiles):
+    """
+    Modification times and sizes of include files
+
+    Parameters
+    ----------
+    incfiles : list of str
+        Include files
+
+    Returns
+    -------
+    list of list
+        [file, mtime, size] for each file in `incfiles`; mtime and size
+        are None if the file does not exist
+
+    """
+    import os
+
+    stats = list()
+    for ii in incfiles:
+        try:
+            st = os.stat(ii)
+            stats.append([ii, st.st_mtime, st.st_size])
+        except OSError:
+            stats.append([ii, None, None])
+
+    return stats
+
+
+def scan_file(ffile, cpp=None, defines=None, incdirs=None):
+    """
+    Scan one Fortran file for provided and used modules
+
+    The file is read only once and scanned with scan_fortran.
+
+    Parameters
+    ----------
+    ffile : str
+        Fortran file name
+    cpp : str, optional
+        Pre-processor command; the pre-processed file will be scanned
+        if given.
+    defines : dict, optional
+        Macros for evaluating pre-processor conditionals with cpp_filter;
+        only the active code will be scanned if given and `cpp` is not
+        given.
+    incdirs : list of str, optional
+        Directories to search for #include files with `defines`
+
+    Returns
+    -------
+    dict
+        Record of scan_fortran with the additional keys 'mtime', 'size',
+        'hash', and 'incstats' with include_stats of all include files.
+        Include files are taken from the original file if `cpp` is given
+        because the pre-processor replaces #include statements.
+
+    """
+    import os
+    import hashlib
+
+    st = os.stat(ffile)
+    fi = open(ffile, 'rb')
+    data = fi.read()
+    fi.close()
+    text = None
+    if cpp:
+        text = preprocess(cpp, ffile)
+    if text is not None:
+        record = scan_fortran(text)
+        record['includes'] = scan_fortran(data)['includes']
+    elif (defines is not None) and _BCPPDIRECTIVE.search(data):
+        # active code and #include directives
+        record = scan_fortran(cpp_filter(
+            data.decode('ascii', 'ignore'), dict(defines),
+            incdirs=incdirs, ffile=ffile))
+    else:
+        record = scan_fortran(data)
+    record['hash'] = hashlib.sha1(data).hexdigest()
+    record['mtime'] = st.st_mtime
+    record['size']  = st.st_size
+    # #define in include files can select the modules used
+    record['incstats'] = include_stats(resolve_includes(
+        ffile, record['includes'], incdirs=incdirs))
+
+    return record
+
+
+def scan_files(opath, srcfiles, cpp=None, njobs=1, defines=None,
+               incdirs=None):
+    """
+    Provided and used modules of Fortran files using a persistent cache
+
+    Only files that are new or whose content or include files changed
+    since the last call are scanned, in parallel if possible
+    (see parallel_map).
+    The cache is kept per source directory in
+    dirname(ffile)/opath/make.d.cache so that changes in one source
+    directory do not touch the caches of the other directories.
+
+    Parameters
+    ----------
+    opath : str
+        Relative output directory.
+        Script assumes compilation into dirname(ffile)/opath
+    srcfiles : list of str
+        List with Fortran files
+    cpp : str, optional
+        Pre-processor command; used modules will be searched in the
+        pre-processed files if given.
+    njobs : int, optional
+        Number of parallel processes if not called by make with a jobserver
+    defines : dict, optional
+        Macros for evaluating pre-processor conditionals if `cpp` is not
+        given, see scan_file
+    incdirs : list of str, optional
+        Directories to search for #include files with `defines`
+
+    Returns
+    -------
+    OrderedDict, set
+        Dictionary with Fortran files as keys in the order of `srcfiles`
+        and records of scan_file as values,
+        and set of Fortran files that were (re-)scanned
+
+    """
+    import os
+    import hashlib
+    from collections import OrderedDict
+
+    # group files per directory
+    dirs = dict()
+    for ff in srcfiles:
+        dirs.setdefault(os.path.dirname(ff), []).append(ff)
+
+    records  = dict()
+    toscan   = list()
+    cfiles   = dict()
+    ichanged = set()
+    for dd in dirs:
+        cfile = dd + '/' + opath + '/' + CACHEFILE
+        cfiles[dd] = cfile
+        cache = read_cache(cfile, cpp=cpp, defines=defines)
+        for ff in dirs[dd]:
+            rec = cache.get(ff)
+            if rec is not None:
+                st = os.stat(ff)
+                if ( (rec['mtime'] != st.st_mtime) or
+                     (rec['size'] != st.st_size) ):
+                    fi = open(ff, 'rb')
+                    ihash = hashlib.sha1(fi.read()).hexdigest()
+                    fi.close()
+                    if ihash == rec['hash']:
+                        # only touched
+                        rec['mtime'] = st.st_mtime
+                        rec['size']  = st.st_size
+                    else:
+                        rec = None
+                    ichanged.add(dd)
+            if (rec is not None) and (include_stats(
+                    [ ii[0] for ii in rec['incstats'] ]) != rec['incstats']):
+                rec = None
+            if rec is None:
+                toscan.append(ff)
+                ichanged.add(dd)
+            else:
+                records[ff] = rec
+        # files removed from directory
+        if len(cache) != len(dirs[dd]):
+            ichanged.add(dd)
+
+    scanned = parallel_map(_scan_file_args,
+                           [ (ff, cpp, defines, incdirs) for ff in toscan ],
+                           njobs=njobs)
+    for ff, rec in zip(toscan, scanned):
+        records[ff] = rec
+
+    for dd in ichanged:
+        write_cache(cfiles[dd],
+                    dict([ (ff, records[ff]) for ff in dirs[dd] ]), cpp=cpp,
+                    defines=defines)
+    records = OrderedDict([ (ff, records[ff]) for ff in srcfiles ])
+
+    return records, set(toscan)
+
+
+def resolve_includes(ffile, includes, incdirs=None, cache=None):
+    """
+    Paths of include files, including include files in include files
+
+    Include files are searched in the directory of the including file and
+    then in the include directories. Include files that are not found,
+    such as system headers, are ignored.
+
+    Parameters
+    ----------
+    ffile : str
+        Fortran file name
+    includes : list of str
+        Files included in `ffile` such as in the record of scan_file
+    incdirs : list of str, optional
+        Include directories such as given with -I to the compiler
+    cache : dict, optional
+        Include files of already resolved include files, updated in place
+
+    Returns
+    -------
+    list of str
+        Paths of all include files of `ffile`
+
+    """
+    import os
+
+    if incdirs is None:
+        incdirs = []
+    if cache is None:
+        cache = dict()
+    found = list()
+    todo  = [ (ffile, ii) for ii in includes ]
+    while todo:
+        parent, inc = todo.pop(0)
+        for dd in [os.path.dirname(parent)] + list(incdirs):
+            iinc = os.path.normpath(os.path.join(dd, inc))
+            if os.path.isfile(iinc):
+                break
+        else:
+            continue
+        if (iinc in found) or (iinc == ffile):
+            continue
+        found.append(iinc)
+        if iinc not in cache:
+            cache[iinc] = scan_fortran(read_fortran(iinc))['includes']
+        todo.extend([ (iinc, ii) for ii in cache[iinc] ])
+
+    return found
+
+
+def f2suff(forfile, opath, suff):
+    """
+    Construct output filename in opath with new suffix
+
+    Parameters
+    ----------
+    forfile : str
+        Fortran90 file name
+    opath : str
+        Relative output path.
+        Script assumes output path: dirname(forfile)/opath
+    suff : str
+        Suffix of input file will be replaced by suff
+
+    Returns
+    -------
+    Name of output file in opath having new suffix
+
+    """
+    import os
+
+    idir  = os.path.dirname(forfile)
+    ifile = os.path.basename(forfile)
+    odir  = idir + '/' + opath
+    ofile = ifile[0:ifile.rfind('.')] + '.' + suff
+
+    return odir + '/' + ofile
+
+
+def f2d(forfile, opath):
+    """
+    Shortcut for f2suff(forfile, opath, 'd')
+    """
+    return f2suff(forfile, opath, 'd')
+
+
+def f2o(forfile, opath):
+    """
+    Shortcut for f2suff(forfile, opath, 'o')
+    """
+    return f2suff(forfile, opath, 'o')
+
+
+def f2stamp(forfile, opath):
+    """
+    Shortcut for f2suff(forfile, opath, 'stamp')
+    """
+    return f2suff(forfile, opath, 'stamp')
+
+
+def mod_interface(modfile, compiler):
+    """
+    Content of a compiled module file without time stamps
+
+    Compilers write the time of compilation into module files, which
+    changes the file without changing the interface of the module.
+    The header with the time stamp is removed for gfortran < 4.9
+    (module file not compressed), the Intel compiler, similar to CMake,
+    and NAG. Module files of all other compilers are taken as they are,
+    which might recompile more files than necessary but never too few.
+
+    Parameters
+    ----------
+    modfile : str
+        Module file such as mo_kind.mod
+    compiler : str
+        Compiler name of the Makefile such as gnu, gnu41, intel2018.0,
+        oneapi, or nag62, see compiler_family
+
+    Returns
+    -------
+    bytes
+        Content of `modfile`, or b'' if `modfile` does not exist
+
+    """
+    import os
+
+    if not os.path.exists(modfile):
+        return b''
+    mf = open(modfile, 'rb')
+    content = mf.read()
+    mf.close()
+
+    family = compiler_family(compiler)
+    if family == 'gnu':
+        # gzip compressed files of gfortran >= 4.9 have no time stamp;
+        # older gfortran write it into the first line
+        if not content.startswith(b'\x1f\x8b'):
+            content = content[content.find(b'\n') + 1:]
+    elif family == 'intel':
+        # first byte is version number, header ends with newline and null
+        ihead = content.find(b'\n\x00', 1)
+        if ihead >= 0:
+            content = content[ihead + 2:]
+    elif family == 'nag':
+        # text file, first line has compiler release and time of compilation
+        content = content[content.find(b'\n') + 1:]
+
+    return content
+
+
+def write_stamp(stampfile, modfiles, compiler):
+    """
+    Write stamp file of an object file if its module interfaces changed
+
+    The stamp file contains a hash of all module files produced by
+    the compilation of one Fortran file. It is only written if the hash
+    changes so that files using the modules are only recompiled if the
+    module interfaces change, and not if only the implementation changes.
+
+    Parameters
+    ----------
+    stampfile : str
+        Stamp file such as mo_kind.stamp in the object directory
+    modfiles : list of str
+        Module files produced by the compilation
+    compiler : str
+        Compiler name of the Makefile such as gnu, gnu41, intel2018.0,
+        oneapi, or nag62, see compiler_family
+
+    Returns
+    -------
+    bool
+        True if `stampfile` was written
+
+    """
+    import os
+    import hashlib
+
+    mhash = hashlib.sha1()
+    for mm in sorted(modfiles):
+        mhash.update(os.path.basename(mm).encode('utf-8') + b'\0')
+        if os.path.exists(mm):
+            mhash.update(hashlib.sha1(mod_interface(mm, compiler)).digest())
+        else:
+            mhash.update(b'missing')
+
+    return write_if_changed(stampfile, mhash.hexdigest() + '\n')
+
+
+def make_one_d(prefile, ffile, opath, moddict, record=None, incdirs=None):
+    """
+    Make dependency files for Fortran90 projects
+
+    Parameters
+    ----------
+    prefile : str
+        (Pre-processed) Fortran input file.
+    ffile : str
+        Original Fortran file name.
+    opath : str
+        Relative output directory.
+        Script assumes compilation into dirname(ffile)/opath
+    moddict : dict
+        Dictionary keys are module names, values are module filenames
+    record : dict, optional
+        Record of scan_file of `ffile`.
+        `prefile` will be scanned with scan_fortran if not given.
+    incdirs : list of str, optional
+        Directories to search for include files
+
+    Returns
+    -------
+    dependency file written dirname(ffile)/opath/basename(ffile).d
+
+    """
+    import codecs
+
+    # List of modules used in input file
+    if record is None:
+        record = scan_fortran(read_fortran(prefile))
+    imods = record_uses(record)
+
+    # Query dictionary for filenames of modules used in fortran file.
+    # Remove own file name for circular dependencies if more than one
+    # module in fortran file.
+    if imods:
+        imodfiles = list()
+        for d in imods:
+            if d in moddict:  # otherwise external module such as netcdf
+                if moddict[d] != ffile:
+                    imodfiles.append(moddict[d])
+    else:
+        imodfiles = []
+
+    # Include files
+    incfiles = resolve_includes(ffile, record['includes'], incdirs=incdirs)
+
+    # Write output .d file
+    dfile = f2d(ffile, opath)
+    ofile = f2o(ffile, opath)
+    df = codecs.open(dfile, 'w', encoding='utf-8')
+    print(dfile, ':', ffile, end='', file=df)
+    for ii in incfiles:
+        print('', ii, end='', file=df)
+    print('', file=df)
+    print(ofile, ':', ffile + ' ' + dfile, end='', file=df)
+    for im in imodfiles:
+        print('', f2o(im, opath), end='', file=df)
+    for ii in incfiles:
+        print('', ii, end='', file=df)
+    print('', file=df)
+    # Empty rules so that make does not fail if include files are removed
+    for ii in incfiles:
+        print(ii, ':', file=df)
+    df.close()
+
+    return
+
+
+class DependencyGraph(object):
+    """
+    Graph of dependencies between Fortran files via modules
+
+    A file depends on all files that provide modules that it uses.
+    A submodule depends on the files of its ancestor module and its parent
+    submodule but files using the ancestor module do not depend on
+    the submodule.
+    Modules that are not provided by any file, such as netcdf, are ignored.
+
+    Parameters
+    ----------
+    records : dict
+        Records of scan_files with Fortran files as keys
+    srcfiles : list of str, optional
+        Order of files; later files overwrite modules of earlier files.
+        Default: keys of `records`
+    incdirs : list of str, optional
+        Directories to search for include files
+
+    Examples
+    --------
+    >>> records, scanned = scan_files('.gnu.release', srcfiles)
+    >>> graph = DependencyGraph(records)
+    >>> for level in graph.levels():
+    ...     print(level)
+    >>> graph.write_make('make.d.mk', '.gnu.release')
+
+    """
+
+    def __init__(self, records, srcfiles=None, incdirs=None):
+        from collections import OrderedDict
+
+        if srcfiles is None:
+            srcfiles = list(records.keys())
+        self.files   = list(srcfiles)
+        self.records = records
+        self.moddict = get_dict(None, records=records, srcfiles=self.files)
+        # deps[file] = files providing modules used in file
+        # edgemods[(file, dep)] = modules of dep used in file
+        # useedges = (file, dep) with modules of dep in use statements,
+        #     others are from submodules to their ancestors and parents
+        self.deps     = OrderedDict()
+        self.rdeps    = OrderedDict([ (ff, list()) for ff in self.files ])
+        self.edgemods = dict()
+        self.useedges = set()
+        for ff in self.files:
+            self.deps[ff] = list()
+            uses = records[ff]['uses']
+            for mm in record_uses(records[ff]):
+                dd = self.moddict.get(mm)
+                # external module or more than one module in file
+                if (dd is None) or (dd == ff):
+                    continue
+                if (ff, dd) not in self.edgemods:
+                    self.deps[ff].append(dd)
+                    self.rdeps[dd].append(ff)
+                    self.edgemods[(ff, dd)] = list()
+                if mm not in self.edgemods[(ff, dd)]:
+                    self.edgemods[(ff, dd)].append(mm)
+                if mm in uses:
+                    self.useedges.add((ff, dd))
+        # incfiles[file] = include files of file
+        self.incfiles = OrderedDict()
+        cache = dict()
+        for ff in self.files:
+            self.incfiles[ff] = resolve_includes(
+                ff, records[ff]['includes'], incdirs=incdirs, cache=cache)
+
+    def dependencies(self, ffile):
+        """
+        Files on which `ffile` depends directly
+        """
+        return self.deps[ffile]
+
+    def includes(self, ffile):
+        """
+        Include files of `ffile`, including nested include files
+        """
+        return self.incfiles[ffile]
+
+    def dependents(self, ffile):
+        """
+        Files that depend directly on `ffile` (reverse edges)
+        """
+        return self.rdeps[ffile]
+
+    def affected(self, changed):
+        """
+        Files that depend directly or indirectly on changed files
+
+        See affected_files.
+        """
+        return affected_files(self.rdeps, self.incfiles, changed)
+
+    def programs(self):
+        """
+        Files with a main program
+        """
+        return [ ff for ff in self.files if self.records[ff]['programs'] ]
+
+    def unused(self):
+        """
+        Files with modules that are not needed by the main programs
+
+        The files needed are the files with main programs and the files
+        providing the modules that they use, directly or indirectly, as
+        well as the submodules of needed modules, which implement their
+        procedures. Files without modules and submodules are always
+        needed because they can have external procedures, which are not
+        in the graph, and so are the modules that they use.
+
+        Returns
+        -------
+        list of str
+            Files in the order of the graph that can be skipped when
+            linking the main programs; empty if there is no main program
+
+        """
+        progs = self.programs()
+        if not progs:
+            return []
+        # submodules implementing the modules of each file
+        impl = dict()
+        for ff in self.files:
+            for ss in self.records[ff]['submodules']:
+                dd = self.moddict.get(ss[1])
+                if (dd is not None) and (dd != ff):
+                    impl.setdefault(dd, list()).append(ff)
+        # files without modules are always needed, and so are the modules
+        # that they use
+        needed = set()
+        todo   = list(progs) + [ ff for ff in self.files
+                                 if not (self.records[ff]['provides'] or
+                                         self.records[ff]['submodules']) ]
+        while todo:
+            ff = todo.pop()
+            if ff in needed:
+                continue
+            needed.add(ff)
+            todo.extend(self.deps[ff])
+            todo.extend(impl.get(ff, []))
+
+        return [ ff for ff in self.files
+                 if (ff not in needed) and
+                 (self.records[ff]['provides'] or
+                  self.records[ff]['submodules']) ]
+
+    def write_index(self, indexfile):
+        """
+        Write reverse dependency index for affected_files
+
+        The JSON file has the dictionaries 'dependents' with the files
+        depending directly on each file, and 'includes' with the include
+        files of each file. The file is only written if its content
+        changes.
+
+        Parameters
+        ----------
+        indexfile : str
+            Output filename
+
+        Returns
+        -------
+        bool
+            True if `indexfile` was written
+
+        """
+        import json
+
+        index = {'dependents': self.rdeps, 'includes': self.incfiles}
+        return write_if_changed(indexfile,
+                                json.dumps(index, indent=1, sort_keys=True)
+                                + '\n')
+
+    def cycles(self):
+        """
+        Circular dependencies between files
+
+        Returns
+        -------
+        list of lists
+            One cycle per group of files that depend on each other,
+            given as list of files [f1, f2, ..., f1]
+            where each file depends on the next one
+
+        """
+        # strongly connected components (Tarjan) without recursion
+        index   = dict()
+        lowlink = dict()
+        onstack = set()
+        stack   = list()
+        sccs    = list()
+        nn = 0
+        for root in self.files:
+            if root in index:
+                continue
+            work = [(root, 0)]
+            while work:
+                ff, ii = work.pop()
+                if ii == 0:
+                    index[ff]   = nn
+                    lowlink[ff] = nn
+                    nn += 1
+                    stack.append(ff)
+                    onstack.add(ff)
+                recurse = False
+                deps = self.deps[ff]
+                while ii < len(deps):
+                    dd = deps[ii]
+                    ii += 1
+                    if dd not in index:
+                        work.append((ff, ii))
+                        work.append((dd, 0))
+                        recurse = True
+                        break
+                    elif dd in onstack:
+                        lowlink[ff] = min(lowlink[ff], index[dd])
+                if recurse:
+                    continue
+                if lowlink[ff] == index[ff]:
+                    scc = list()
+                    while True:
+                        dd = stack.pop()
+                        onstack.discard(dd)
+                        scc.append(dd)
+                        if dd == ff:
+                            break
+                    if len(scc) > 1:
+                        sccs.append(set(scc))
+                if work:
+                    pp = work[-1][0]
+                    lowlink[pp] = min(lowlink[pp], lowlink[ff])
+
+        # one shortest cycle per component
+        cycles = list()
+        for scc in sccs:
+            start = [ ff for ff in self.files if ff in scc ][0]
+            prev  = {start: None}
+            queue = [start]
+            found = None
+            while queue and (found is None):
+                ff = queue.pop(0)
+                for dd in self.deps[ff]:
+                    if dd == start:
+                        found = ff
+                        break
+                    if (dd in scc) and (dd not in prev):
+                        prev[dd] = ff
+                        queue.append(dd)
+            path = [start]
+            ff = found
+            while ff != start:
+                path.insert(1, ff)
+                ff = prev[ff]
+            cycles.append(path + [start])
+
+        return cycles
+
+    def cycle_report(self):
+        """
+        Readable report of circular dependencies
+
+        Returns
+        -------
+        str
+            One line per cycle such as
+            'a.f90 --(mo_b)--> b.f90 --(mo_a)--> a.f90',
+            empty string if there are no cycles
+
+        """
+        lines = list()
+        for cc in self.cycles():
+            line = cc[0]
+            for ff, dd in zip(cc[:-1], cc[1:]):
+                line += ' --(' + ','.join(self.edgemods[(ff, dd)]) + ')--> '
+                line += dd
+            lines.append(line)
+
+        return '\n'.join(lines)
+
+    def levels(self):
+        """
+        Files grouped into topological levels
+
+        Files of level 0 depend on no other file, files of level n depend
+        only on files of levels < n, and at least on one file of level n-1.
+        All files of one level can hence be compiled in parallel.
+
+        Returns
+        -------
+        list of lists
+            Files per level
+
+        Raises
+        ------
+        ValueError
+            If there are circular dependencies
+
+        """
+        report = self.cycle_report()
+        if report:
+            raise ValueError('Circular dependencies between Fortran files:\n'
+                             + report)
+        level = dict()
+        for ff in self.order():
+            level[ff] = 1 + max([-1] + [ level[dd] for dd in self.deps[ff] ])
+        levels = [ list() for ii in range(1 + max([-1] +
+                                                   list(level.values()))) ]
+        for ff in self.files:
+            levels[level[ff]].append(ff)
+
+        return levels
+
+    def order(self):
+        """
+        Files in topological order, i.e. each file after its dependencies
+
+        Files in cycles are put in order of `srcfiles`.
+
+        Returns
+        -------
+        list of str
+            Fortran files
+
+        """
+        done  = set()
+        order = list()
+        for root in self.files:
+            if root in done:
+                continue
+            work = [(root, iter(self.deps[root]))]
+            done.add(root)
+            while work:
+                ff, it = work[-1]
+                for dd in it:
+                    if dd not in done:
+                        done.add(dd)
+                        work.append((dd, iter(self.deps[dd])))
+                        break
+                else:
+                    work.pop()
+                    order.append(ff)
+
+        return order
+
+    def file_weights(self, weights=None):
+        """
+        Weight of each file such as its compile time
+
+        Files without weight in `weights` get the mean of the given weights,
+        all files get 1 if `weights` is not given.
+        """
+        if not weights:
+            return dict([ (ff, 1.) for ff in self.files ])
+        known = [ weights[ff] for ff in self.files if ff in weights ]
+        if known:
+            mean = float(sum(known)) / float(len(known))
+        else:
+            mean = 1.
+        return dict([ (ff, float(weights.get(ff, mean)))
+                      for ff in self.files ])
+
+    def critical_path(self, weights=None):
+        """
+        Longest chain of files that have to be compiled one after the other
+
+        Parameters
+        ----------
+        weights : dict, optional
+            Compile times of files; files without weight get the mean of the
+            given weights. Default: 1 for each file
+
+        Returns
+        -------
+        float, list of str
+            Length of critical path, i.e. the sum of the weights along the
+            path, and files on the path in order of compilation
+
+        """
+        ww = self.file_weights(weights)
+        finish = dict()
+        prev   = dict()
+        for ff in self.order():
+            start = 0.
+            prev[ff] = None
+            for dd in self.deps[ff]:
+                if finish.get(dd, 0.) > start:
+                    start    = finish[dd]
+                    prev[ff] = dd
+            finish[ff] = start + ww[ff]
+        if not finish:
+            return 0., []
+        ff = max(self.files, key=lambda ff: finish[ff])
+        length = finish[ff]
+        path = list()
+        while ff is not None:
+            path.insert(0, ff)
+            ff = prev[ff]
+
+        return length, path
+
+    def priorities(self, weights=None):
+        """
+        Length of the longest chain from each file to the end of the build
+
+        Files with higher priority should be compiled first.
+
+        Parameters
+        ----------
+        weights : dict, optional
+            Compile times of files, see critical_path
+
+        Returns
+        -------
+        dict
+            Priority of each file including its own weight
+
+        """
+        ww = self.file_weights(weights)
+        prio = dict()
+        for ff in reversed(self.order()):
+            prio[ff] = ww[ff] + max([0.] + [ prio.get(dd, 0.)
+                                             for dd in self.rdeps[ff] ])
+
+        return prio
+
+    def width(self, weights=None):
+        """
+        Maximum number of files that can be compiled at the same time
+
+        Files start as soon as their dependencies are compiled,
+        i.e. with unlimited parallel processes. More parallel processes
+        than this width do not speed up compilation.
+
+        Parameters
+        ----------
+        weights : dict, optional
+            Compile times of files, see critical_path
+
+        Returns
+        -------
+        int
+            Maximum number of files compiled in parallel
+
+        """
+        ww = self.file_weights(weights)
+        finish = dict()
+        events = list()
+        for ff in self.order():
+            start = max([0.] + [ finish.get(dd, 0.) for dd in self.deps[ff] ])
+            finish[ff] = start + ww[ff]
+            # ends sort before starts at the same time
+            events.append((start, 1))
+            events.append((finish[ff], -1))
+        nmax = 0
+        nn   = 0
+        for tt, dn in sorted(events):
+            nn  += dn
+            nmax = max(nmax, nn)
+
+        return nmax
+
+    def write_make(self, mkfile, opath, firewall=False):
+        """
+        Write dependencies of all files into one makefile
+
+        Each object file depends on its Fortran file, its include files,
+        and on the object files of the Fortran files providing the modules
+        that it uses. The variable MAKEDUNUSED lists the object files
+        that are not needed by the main programs, see unused.
+        The file is only written if its content changes.
+
+        In firewall mode, object files depend on the stamp files of the
+        Fortran files providing the modules instead, which change only if
+        the module interfaces change (see write_stamp). The target-specific
+        variable MODS of each object file gives the module files produced
+        by its compilation. Submodules still depend on the object files of
+        their ancestors and parents because they can access private
+        entities of their ancestors, which are not in the .mod files.
+
+        Parameters
+        ----------
+        mkfile : str
+            Output filename, included by the Makefile
+        opath : str
+            Relative output directory.
+            Script assumes compilation into dirname(ffile)/opath
+        firewall : bool, optional
+            If True, object files depend on stamp files instead of
+            object files (default: False)
+
+        Returns
+        -------
+        bool
+            True if `mkfile` was written
+
+        """
+        import os
+
+        lines = list()
+        for ff in self.files:
+            line = f2o(ff, opath) + ' : ' + ff
+            for dd in self.deps[ff]:
+                if firewall and ((ff, dd) in self.useedges):
+                    line += ' ' + f2stamp(dd, opath)
+                else:
+                    line += ' ' + f2o(dd, opath)
+            for ii in self.incfiles[ff]:
+                line += ' ' + ii
+            lines.append(line)
+            if firewall and self.records[ff]['provides']:
+                odir = os.path.dirname(f2o(ff, opath))
+                line = f2o(ff, opath) + ' : MODS :='
+                for mm in self.records[ff]['provides']:
+                    line += ' ' + odir + '/' + mm + '.mod'
+                lines.append(line)
+        # Redo makefile if include files change, which can include others.
+        # Empty rules so that make does not fail if include files are removed.
+        incfiles = list()
+        for ff in self.files:
+            for ii in self.incfiles[ff]:
+                if ii not in incfiles:
+                    incfiles.append(ii)
+        if incfiles:
+            lines.append(mkfile + ' : ' + ' '.join(incfiles))
+            for ii in incfiles:
+                lines.append(ii + ' :')
+        lines.append('MAKEDUNUSED := ' +
+                     ' '.join([ f2o(ff, opath) for ff in self.unused() ]))
+
+        return write_if_changed(mkfile,
+                                ''.join([ ll + '\n' for ll in lines ]))
+
+
+def write_graph(graph, opath, firewall=False, prune=False):
+    """
+    Write makefile with all dependencies and reverse dependency index
+
+    Both are written into the object directory of the first Fortran
+    file; a makefile that did not change is touched so that it is newer
+    than the Fortran files and make does not redo it. Circular
+    dependencies are reported on standard error, and Fortran files not
+    needed by the main programs on standard output if `prune` is True.
+
+    Parameters
+    ----------
+    graph : DependencyGraph
+        Dependencies of all Fortran files
+    opath : str
+        Relative output directory.
+        Script assumes compilation into dirname(ffile)/opath
+    firewall : bool, optional
+        If True, write makefile of firewall mode (default: False)
+    prune : bool, optional
+        If True, list the Fortran files not needed by the main programs,
+        which are not compiled with prune=true (default: False)
+
+    Returns
+    -------
+    str
+        Makefile with all dependencies
+
+    """
+    import os
+    import sys
+
+    report = graph.cycle_report()
+    if report:
+        print('Warning: circular dependencies between Fortran files:',
+              file=sys.stderr)
+        print(report, file=sys.stderr)
+    unused = graph.unused() if prune else []
+    if unused:
+        print('{} Fortran files not needed by the main program,'
+              ' skipped with prune=true:'.format(len(unused)))
+        for ff in unused:
+            print('    ' + ff)
+    firstdir = os.path.dirname(graph.files[0])
+    if firewall:
+        mkfile = firstdir + '/' + opath + '/' + FIREWALLFILE
+    else:
+        mkfile = firstdir + '/' + opath + '/' + DEPSFILE
+    if not graph.write_make(mkfile, opath, firewall=firewall):
+        # newer than Fortran files so that make does not redo it
+        os.utime(mkfile, None)
+    graph.write_index(firstdir + '/' + opath + '/' + INDEXFILE)
+
+    return mkfile
+
+
+def read_srcfiles(srcfilelist):
+    """
+    File names from files with lists of file names, one per line
+
+    Parameters
+    ----------
+    srcfilelist : list of str
+        Files with lists of file names such as make.d.srcs
+
+    Returns
+    -------
+    list of str
+        File names of all files in `srcfilelist`, empty lines removed
+
+    """
+    import codecs
+
+    srcfiles = []
+    for ff in srcfilelist:
+        fs = codecs.open(ff, 'r', encoding='utf-8')
+        srcfiles.extend(fs.read().split('\n'))
+        fs.close()
+
+    return [ ss for ss in srcfiles if ss.strip() != '' ]
+
+
+def compiler_family(compiler):
+    """
+    Family of a compiler of make.config such as gnu for gnu102
+
+    Parameters
+    ----------
+    compiler : str
+        Compiler name such as gnu102, intel2020, oneapi, or pgfortran184
+
+    Returns
+    -------
+    str
+        gnu, intel, nag, pgi, or '' if the family is unknown
+
+    Examples
+    --------
+    >>> compiler_family('oneapi2022.0.0')
+    'intel'
+
+    """
+    for family, prefixes in FAMILIES:
+        if compiler.lower().startswith(prefixes):
+            return family
+
+    return ''
+
+
+def read_profile(pfile):
+    """
+    Read a flag profile with compiler flags for source files
+
+    Each line of the profile has a glob pattern followed by compiler flags.
+    Lines following a section such as [intel] or [gnu102, nag] apply only
+    to the compilers of these families or with these names; lines before
+    the first section or following [*] apply to all compilers.
+    Patterns are matched against the file name without path or, if they
+    contain a /, against the full path of the source file.
+    Empty lines and text after # are ignored, e.g.
+    .. code-block::
+
+       # all compilers
+       mo_kind.f90          -O0
+       [gnu]
+       */special/*.f90      -O3 -funroll-loops
+       [intel]
+       mo_ncwrite.f90       -assume norealloc-lhs
+
+    Parameters
+    ----------
+    pfile : str
+        Flag profile
+
+    Returns
+    -------
+    list of tuple
+        (sections, pattern, flags) for each line in file order, with
+        sections None for all compilers
+
+    """
+    import codecs
+
+    entries  = list()
+    sections = None
+    fp = codecs.open(pfile, 'r', encoding='utf-8')
+    for nn, line in enumerate(fp):
+        line = line.split('#', 1)[0].strip()
+        if not line:
+            continue
+        if line.startswith('['):
+            if not line.endswith(']'):
+                fp.close()
+                raise ValueError('{}:{}: section without ]: {}'.format(
+                    pfile, nn + 1, line))
+            sections = line[1:-1].replace(',', ' ').lower().split()
+            if '*' in sections:
+                sections = None
+            continue
+        ll = line.split(None, 1)
+        if len(ll) < 2:
+            fp.close()
+            raise ValueError('{}:{}: pattern without flags: {}'.format(
+                pfile, nn + 1, line))
+        entries.append((sections, ll[0], ll[1]))
+    fp.close()
+
+    return entries
+
+
+def profile_flags(entries, src, compiler=''):
+    """
+    Compiler flags of a source file from the lines of a flag profile
+
+    Parameters
+    ----------
+    entries : list of tuple
+        Lines of the flag profile as returned by read_profile
+    src : str
+        Source file
+    compiler : str, optional
+        Compiler name such as gnu102 selecting the sections of the profile
+
+    Returns
+    -------
+    str
+        Flags of all matching lines in file order so that
+        later flags override earlier ones
+
+    """
+    import os
+    import fnmatch
+
+    names = [compiler.lower(), compiler_family(compiler)]
+    base  = os.path.basename(src)
+    flags = list()
+    for sections, pattern, ff in entries:
+        if (sections is not None) and (not [ ss for ss in sections
+                                             if ss in names ]):
+            continue
+        if fnmatch.fnmatchcase(src if '/' in pattern else base, pattern):
+            flags.append(ff)
+
+    return ' '.join(flags)
+
+
+def make_srcmap(mapfile, listfiles, exclude='', profile=None, compiler=''):
+    """
+    Makefile with the source file and flags of each object file
+
+    Writes target-specific variables such as
+    .. code-block::
+
+       /path/.gnu.release/mo_kind.o /path/.gnu.release/mo_kind.d : \
+           SRC := /path/mo_kind.f90
+
+    so that the recipes of the Makefile do not have to look up the source
+    files of their targets. If a flag profile is given, the flags of
+    the source file, see read_profile, are set in the target-specific
+    variable SRCFLAGS of each object file, which is appended to the
+    compiler flags in the recipes. SRCFLAGS is set for every object file
+    then, also if empty, so that object files made as prerequisites of
+    another object file do not inherit its flags.
+    Object files whose flags changed since the last call are removed so
+    that make compiles them again with the new flags.
+    The file is only written if its content changes.
+
+    Parameters
+    ----------
+    mapfile : str
+        Output makefile
+    listfiles : list of str
+        Pairs of files with lists of source files and lists of
+        corresponding object files such as
+        [make.d.srcs, make.d.objs, make.d.csrcs, make.d.cobjs]
+    exclude : str, optional
+        Source files (without path) that are compiled without Intel's
+        realloc-lhs flag, matched case-insensitively as in
+        'echo $(INTEL_EXCLUDE) | grep -i file'. They get the flags
+        -assume norealloc-lhs, before the flags of the profile, if
+        `compiler` is of the Intel family.
+    profile : str, optional
+        Flag profile with compiler flags for source files
+    compiler : str, optional
+        Compiler name such as gnu102 selecting the sections of the profile
+
+    Returns
+    -------
+    bool
+        True if `mapfile` was written
+
+    """
+    import os
+    import codecs
+
+    if len(listfiles) % 2 != 0:
+        raise IOError('Source map needs pairs of source and object lists.')
+    entries = read_profile(profile) if profile else []
+    exclude = exclude.lower()
+    intel   = bool(exclude) and (compiler_family(compiler) == 'intel')
+    lines   = list()
+    flagsep = ' : ' + FLAGSVAR + ' := '
+    oldflags = dict()
+    if os.path.exists(mapfile):
+        mf = codecs.open(mapfile, 'r', encoding='utf-8')
+        for ll in mf:
+            if flagsep in ll:
+                obj, ff = ll.rstrip('\n').split(flagsep, 1)
+                oldflags[obj] = ff
+        mf.close()
+    newflags = dict()
+    for ii in range(0, len(listfiles), 2):
+        lists = list()
+        for ll in listfiles[ii:ii + 2]:
+            lf = codecs.open(ll, 'r', encoding='utf-8')
+            lists.append([ ff.strip() for ff in lf if ff.strip() ])
+            lf.close()
+        for src, obj in zip(*lists):
+            lines.append(obj + ' ' + obj[:obj.rfind('.')] + '.d : SRC := ' +
+                         src)
+            if not (entries or intel):
+                continue
+            flags = profile_flags(entries, src, compiler)
+            if intel and (os.path.basename(src).lower() in exclude):
+                flags = ('-assume norealloc-lhs ' + flags).strip()
+            newflags[obj] = flags
+            lines.append(obj + flagsep + flags)
+    for obj in set(oldflags) | set(newflags):
+        if oldflags.get(obj, '') != newflags.get(obj, ''):
+            if os.path.exists(obj):
+                os.remove(obj)
+
+    return write_if_changed(mapfile, ''.join([ ll + '\n' for ll in lines ]))
+
+
+def write_manifest(lists, dirs=None, mapfile=None, pairs=None, exclude='',
+                   profile=None, compiler=''):
+    """
+    Write the lists of files of the Makefile only if they change
+
+    Makes missing directories, writes each list of files with one file
+    per line, and writes the makefile with the source file of each object
+    file with make_srcmap. Files are only written if their content
+    changes so that a make without changes does not modify any file.
+
+    Parameters
+    ----------
+    lists : list of list of str
+        Each list has the output file followed by the files to list,
+        e.g. [[make.d.srcs, mo_kind.f90, main.f90], [make.d.dobjs]]
+    dirs : list of str, optional
+        Directories to make if they do not exist such as object directories
+    mapfile : str, optional
+        Output makefile of make_srcmap
+    pairs : list of str, optional
+        Pairs of list files for make_srcmap
+    exclude : str, optional
+        Source files compiled without Intel's realloc-lhs flag,
+        see make_srcmap
+    profile : str, optional
+        Flag profile for make_srcmap
+    compiler : str, optional
+        Compiler name selecting the sections of the flag profile
+
+    Returns
+    -------
+    list of str
+        Files that were written
+
+    """
+    import os
+
+    for dd in dirs or []:
+        if not os.path.isdir(dd):
+            os.makedirs(dd)
+    written = list()
+    for ll in lists:
+        if write_if_changed(ll[0], '\n'.join(ll[1:]) + '\n'):
+            written.append(ll[0])
+    if mapfile:
+        if make_srcmap(mapfile, pairs or [], exclude=exclude,
+                       profile=profile, compiler=compiler):
+            written.append(mapfile)
+
+    return written
+
+
+def manifest_main(argv):
+    """
+    Command line interface of manifest:
+    make.d.py manifest [--mkdir Dir ...] [-l File [File ...]] ...
+        [-m MapFile] [-p ListFile ...] [-x Files] [-f Profile]
+        [-c Compiler]
+
+    The options are parsed by hand because the listed files can start
+    with - such as -L/path in make.d.lobjs. Arguments can also be given
+    in a file with @File.
+    """
+    import sys
+
+    args = list()
+    for aa in argv:
+        if aa.startswith('@'):
+            af = open(aa[1:], 'r')
+            args.extend(af.read().split())
+            af.close()
+        else:
+            args.append(aa)
+    opts  = {'--mkdir': [], '-m': [], '-p': [], '-x': [], '-f': [],
+             '-c': []}
+    lists = list()
+    cur   = None
+    for aa in args:
+        if aa in ('-h', '--help'):
+            print(manifest_main.__doc__)
+            sys.exit(0)
+        elif aa == '-l':
+            lists.append([])
+            cur = lists[-1]
+        elif aa in opts:
+            cur = opts[aa]
+        elif cur is None:
+            raise IOError('make.d.py manifest: unknown argument: ' + aa)
+        else:
+            cur.append(aa)
+    if [ ll for ll in lists if not ll ]:
+        raise IOError('make.d.py manifest: -l needs an output file.')
+
+    write_manifest(lists, dirs=opts['--mkdir'],
+                   mapfile=(opts['-m'] or [None])[0], pairs=opts['-p'],
+                   exclude=' '.join(opts['-x']),
+                   profile=(opts['-f'] or [None])[0],
+                   compiler=(opts['-c'] or [''])[0])
+
+
+def read_weights(wfile, srcfiles, opath):
+    """
+    Compile times of Fortran files
+
+    Parameters
+    ----------
+    wfile : str
+        JSON file with a dictionary of compile times in seconds.
+        Keys can be source files, object files, or their basenames.
+    srcfiles : list of str
+        Fortran files
+    opath : str
+        Relative output directory.
+        Script assumes compilation into dirname(ffile)/opath
+
+    Returns
+    -------
+    dict
+        Compile times with files of `srcfiles` as keys; files without
+        compile time in `wfile` are not in the dictionary
+
+    """
+    import os
+    import json
+    import codecs
+
+    wf = codecs.open(wfile, 'r', encoding='utf-8')
+    times = json.load(wf)
+    wf.close()
+    weights = dict()
+    for ff in srcfiles:
+        oo = f2o(ff, opath)
+        for kk in [ff, oo, os.path.basename(ff), os.path.basename(oo)]:
+            if kk in times:
+                weights[ff] = float(times[kk])
+                break
+
+    return weights
+
+
+def schedule(opath, srcfilelist, weightfile=None, orderfile=None,
+             defines=None, incdirs=None, njobs=1):
+    """
+    Report on the parallel compilation of Fortran files
+
+    Prints the topological levels, the critical path, i.e. the longest
+    chain of files that must be compiled one after the other,
+    and the maximum useful number of parallel jobs (make -j).
+
+    Parameters
+    ----------
+    opath : str
+        Relative output directory.
+        Script assumes compilation into dirname(ffile)/opath
+    srcfilelist : list of str
+        File(s) with list(s) of all source files
+    weightfile : str, optional
+        JSON file with compile times of the files (see read_weights).
+        Each file counts as 1 if not given.
+    orderfile : str, optional
+        Makefile setting the variable MAKEDORDER to all object files,
+        ordered by the length of the longest chain of files depending on
+        them, so that make starts files on the critical path first.
+    defines : list of str, optional
+        Pre-processor definitions such as given to make_d in batch mode
+    incdirs : list of str, optional
+        Include directories such as given to make_d in batch mode
+    njobs : int, optional
+        Number of parallel processes for scanning files
+
+    Returns
+    -------
+    dict
+        'levels', 'critical_path' (files), 'length' (of critical path),
+        'work' (sum of weights), 'width' (maximum useful -j),
+        'order' (files in order of priority)
+
+    """
+    import os
+
+    srcfiles = read_srcfiles(srcfilelist)
+    records, scanned = scan_files(opath, srcfiles, njobs=njobs,
+                                  defines=cpp_defines(defines or []),
+                                  incdirs=incdirs)
+    graph = DependencyGraph(records, srcfiles=srcfiles, incdirs=incdirs)
+    report = graph.cycle_report()
+    if report:
+        raise ValueError('Circular dependencies between Fortran files:\n'
+                         + report)
+    if weightfile:
+        weights = read_weights(weightfile, srcfiles, opath)
+        unit    = ' s'
+    else:
+        weights = None
+        unit    = ''
+    ww       = graph.file_weights(weights)
+    levels   = graph.levels()
+    length, path = graph.critical_path(weights)
+    width    = graph.width(weights)
+    work     = sum(ww.values())
+    prio     = graph.priorities(weights)
+    order    = sorted(srcfiles, key=lambda ff: -prio[ff])
+
+    print('Files: {:d}  levels: {:d}'.format(len(srcfiles), len(levels)))
+    print('Total work: {:.6g}{:s}  critical path: {:.6g}{:s}'.format(
+        work, unit, length, unit))
+    if length > 0.:
+        print('Average parallelism: {:.2f}  maximum useful -j: {:d}'.format(
+            work / length, width))
+    for ii, ll in enumerate(levels):
+        print('Level {:d}: {:d} files'.format(ii, len(ll)))
+    print('Critical path:')
+    for ff in path:
+        print('    {:s} ({:.6g}{:s})'.format(os.path.basename(ff), ww[ff],
+                                             unit))
+
+    if orderfile:
+        write_if_changed(orderfile, 'MAKEDORDER := ' +
+                         ' '.join([ f2o(ff, opath) for ff in order ]) + '\n')
+
+    return {'levels': levels, 'critical_path': path, 'length': length,
+            'work': work, 'width': width, 'order': order}
+
+
+def schedule_main(argv):
+    """
+    Command line interface of schedule: make.d.py schedule [options] ...
+    """
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        prog='make.d.py schedule',
+        description='Report levels, critical path and maximum useful -j'
+                    ' of the compilation of Fortran files.')
+    parser.add_argument(
+        '-t', '--times', action='store', default=None, dest='weightfile',
+        metavar='TimesFile',
+        help='JSON file with compile times of files in seconds.')
+    parser.add_argument(
+        '-o', '--order', action='store', default=None, dest='orderfile',
+        metavar='OrderFile',
+        help='write makefile with object files ordered by priority.')
+    parser.add_argument(
+        '-D', '--define', action='append', default=[], dest='defines',
+        metavar='Name[=Value]', help='pre-processor definition.')
+    parser.add_argument(
+        '-I', '--include', action='append', default=[], dest='incdirs',
+        metavar='Dir', help='directory to search for include files.')
+    parser.add_argument(
+        '-j', '--jobs', action='store', type=int, default=1, dest='njobs',
+        metavar='N', help='number of parallel processes for scanning.')
+    parser.add_argument(
+        'opath', metavar='OutputPath', help='relative output directory.')
+    parser.add_argument(
+        'srcfilelist', nargs='+', metavar='FilesWithSourceFileList',
+        help='file(s) with list(s) of all source files.')
+    args = parser.parse_args(argv)
+
+    schedule(args.opath, args.srcfilelist, weightfile=args.weightfile,
+             orderfile=args.orderfile, defines=args.defines,
+             incdirs=args.incdirs, njobs=args.njobs)
+
+
+def affected_files(dependents, includes, changed):
+    """
+    Files that depend directly or indirectly on changed files
+
+    These are the Fortran files that are recompiled if the changed files
+    change: changed Fortran files, Fortran files including changed
+    include files, and all files depending on them via modules.
+
+    Parameters
+    ----------
+    dependents : dict
+        Files depending directly on each Fortran file,
+        see DependencyGraph.dependents
+    includes : dict
+        Include files of each Fortran file, see DependencyGraph.includes
+    changed : list of str
+        Changed files; files are compared by their real paths
+
+    Returns
+    -------
+    list of str
+        Affected files in the order of `dependents`
+
+    """
+    import os
+
+    ichanged = set([ os.path.realpath(cc) for cc in changed ])
+    todo = [ ff for ff in dependents
+             if (os.path.realpath(ff) in ichanged) or
+             any([ os.path.realpath(ii) in ichanged
+                   for ii in includes.get(ff, []) ]) ]
+    seen = set(todo)
+    while todo:
+        ff = todo.pop()
+        for dd in dependents.get(ff, []):
+            if dd not in seen:
+                seen.add(dd)
+                todo.append(dd)
+
+    return [ ff for ff in dependents if ff in seen ]
+
+
+def read_index(indexfile):
+    """
+    Read reverse dependency index of DependencyGraph.write_index
+
+    Returns
+    -------
+    dict, dict
+        'dependents' and 'includes' of each Fortran file
+
+    """
+    import json
+
+    fi = open(indexfile, 'r')
+    index = json.load(fi)
+    fi.close()
+
+    return index['dependents'], index['includes']
+
+
+def changed_files(changed):
+    """
+    Changed files given by file names or git revisions
+
+    Arguments that are no files are given to git diff --name-only, i.e.
+    a revision gives the files changed since the revision, and a range
+    such as main..HEAD gives the files changed in the range. Arguments
+    that are neither files nor revisions are taken as files, e.g.
+    removed files.
+
+    Parameters
+    ----------
+    changed : list of str
+        File names and git revisions or ranges
+
+    Returns
+    -------
+    list of str
+        Changed files; files of git with absolute paths
+
+    """
+    import os
+    import subprocess
+
+    files = list()
+    for cc in changed:
+        if os.path.exists(cc):
+            files.append(cc)
+            continue
+        devnull = open(os.devnull, 'w')
+        try:
+            top = subprocess.check_output(
+                ['git', 'rev-parse', '--show-toplevel'],
+                stderr=devnull).decode('utf-8').strip()
+            out = subprocess.check_output(
+                ['git', 'diff', '--name-only', cc, '--'],
+                stderr=devnull).decode('utf-8')
+            files.extend([ os.path.join(top, ff) for ff in out.split('\n')
+                           if ff ])
+        except (OSError, subprocess.CalledProcessError):
+            files.append(cc)
+        finally:
+            devnull.close()
+
+    return files
+
+
+def affected_tests(testdirs, changed, suffixes=None, always=None,
+                   opath=None, defines=None):
+    """
+    Test directories affected by changed files
+
+    A test directory is affected if a changed file is one of its files,
+    such as a link to a source file of the project, or if one of its
+    Fortran files depends directly or indirectly on a changed file,
+    e.g. via include files. All test directories are affected if a
+    changed file is in one of the directories `always` such as the
+    make.config directory.
+
+    Parameters
+    ----------
+    testdirs : list of str
+        Test directories; libraries built with a test are given as
+        dir=libdir1,libdir2
+    changed : list of str
+        Changed files
+    suffixes : list of str, optional
+        Suffixes of Fortran files (default: .f90 .F90 .f .F and others)
+    always : list of str, optional
+        Files and directories whose changes affect all tests
+    opath : str, optional
+        Relative output directory of the builds of the tests such as
+        .gnu.release. The Fortran files are then scanned with the scan
+        caches of the builds, see scan_files, as in make_d.
+        Default: scan all Fortran files without cache.
+    defines : list of str, optional
+        Pre-processor definitions such as given to make_d in batch mode
+
+    Returns
+    -------
+    list of str
+        Affected test directories without library directories
+
+    """
+    import os
+
+    if suffixes is None:
+        suffixes = ['.f90', '.F90', '.f95', '.F95', '.f03', '.F03', '.f08',
+                    '.F08', '.f', '.F', '.for', '.FOR', '.f77', '.F77',
+                    '.ftn', '.FTN']
+    ichanged = set([ os.path.realpath(cc) for cc in changed ])
+
+    tdirs = [ tt.split('=')[0] for tt in testdirs ]
+    for aa in (always or []):
+        aa = os.path.realpath(aa)
+        for cc in ichanged:
+            if (cc == aa) or cc.startswith(aa + os.sep):
+                return tdirs
+
+    affected = list()
+    for tt, tdir in zip(testdirs, tdirs):
+        dirs = [tdir]
+        if '=' in tt:
+            dirs += [ dd for dd in tt.split('=', 1)[1].split(',') if dd ]
+        files = list()
+        for dd in dirs:
+            if os.path.isdir(dd):
+                files += [ os.path.join(dd, ff)
+                           for ff in sorted(os.listdir(dd))
+                           if os.path.isfile(os.path.join(dd, ff)) ]
+        if any([ os.path.realpath(ff) in ichanged for ff in files ]):
+            affected.append(tdir)
+            continue
+        srcfiles = [ ff for ff in files
+                     if os.path.splitext(ff)[1] in suffixes ]
+        if not srcfiles:
+            continue
+        if opath:
+            records, scanned = scan_files(
+                opath, srcfiles, defines=cpp_defines(defines or []),
+                incdirs=dirs)
+        else:
+            records = dict([ (ff, scan_file(ff)) for ff in srcfiles ])
+        graph = DependencyGraph(records, srcfiles=srcfiles, incdirs=dirs)
+        if graph.affected(changed):
+            affected.append(tdir)
+
+    return affected
+
+
+def affected_main(argv):
+    """
+    Command line interface of affected: make.d.py affected [options] Changed
+    """
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        prog='make.d.py affected',
+        description='Fortran files recompiled or test directories affected'
+                    ' by changed files, given as files or git revisions.')
+    parser.add_argument(
+        '-i', '--index', action='store', default=None, dest='indexfile',
+        metavar='IndexFile',
+        help='reverse dependency index of the build: print the Fortran'
+             ' files recompiled.')
+    parser.add_argument(
+        '-t', '--test', action='append', default=[], dest='testdirs',
+        metavar='Dir[=LibDir,...]',
+        help='test directory with the directories of its libraries:'
+             ' print the affected test directories.')
+    parser.add_argument(
+        '-s', '--suffixes', action='store', default=None, dest='suffixes',
+        metavar='Suffixes',
+        help='whitespace separated suffixes of Fortran files.')
+    parser.add_argument(
+        '-a', '--always', action='append', default=[], dest='always',
+        metavar='Path',
+        help='file or directory whose changes affect all tests.')
+    parser.add_argument(
+        '-o', '--opath', action='store', default=None, dest='opath',
+        metavar='OutputPath',
+        help='relative output directory of the builds of the tests:'
+             ' use their scan caches.')
+    parser.add_argument(
+        '-D', '--define', action='append', default=[], dest='defines',
+        metavar='Name[=Value]',
+        help='pre-processor definition of the builds of the tests;'
+             ' can be given several times.')
+    parser.add_argument(
+        'changed', nargs='*', metavar='Changed',
+        help='changed files or git revisions such as main or main..HEAD.')
+    args = parser.parse_args(argv)
+
+    changed = changed_files(args.changed)
+    if args.indexfile:
+        dependents, includes = read_index(args.indexfile)
+        for ff in affected_files(dependents, includes, changed):
+            print(ff)
+    if args.testdirs:
+        suffixes = args.suffixes.split() if args.suffixes else None
+        for tt in affected_tests(args.testdirs, changed, suffixes=suffixes,
+                                 always=args.always, opath=args.opath,
+                                 defines=args.defines):
+            print(tt)
+
+
+def run_traced(tracefile, kind, target, command):
+    """
+    Run a command and append its timing to a trace file
+
+    Writes one line of JSON per command with the target, the kind of
+    the command, the compiler (first word of the command or of the
+    command after -- of wrappers such as make.d.py objcache), start and
+    end time in seconds since the epoch, the peak resident set size of
+    the command in kB if available, and the exit status.
+
+    Parameters
+    ----------
+    tracefile : str
+        Trace file; lines are appended
+    kind : str
+        Kind of command, e.g. 'depend', 'compile', 'link'
+    target : str
+        Target of make that the command builds
+    command : list of str
+        Command and its arguments
+
+    Returns
+    -------
+    int
+        Exit status of the command
+
+    """
+    import os
+    import sys
+    import time
+    import json
+    import subprocess
+
+    start = time.time()
+    # keep file descriptors of the make jobserver open
+    status = subprocess.call(command, close_fds=False)
+    end = time.time()
+    try:
+        import resource
+        rss = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+        if sys.platform == 'darwin':
+            rss = rss // 1024
+    except ImportError:
+        rss = None
+
+    # compiler of wrapped commands such as make.d.py objcache ... -- cmd
+    compiler = command[0]
+    if '--' in command[:-1]:
+        compiler = command[len(command) - command[::-1].index('--')]
+    record = {'target': target, 'kind': kind,
+              'compiler': os.path.basename(compiler),
+              'start': start, 'end': end, 'rss': rss, 'status': status}
+    # one write in append mode so that parallel jobs do not mix lines
+    fd = os.open(tracefile, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+    os.write(fd, (json.dumps(record, sort_keys=True) + '\n').encode('utf-8'))
+    os.close(fd)
+
+    return status
+
+
+def run_main(argv):
+    """
+    Command line interface of run: make.d.py run [options] -- command ...
+    """
+    import sys
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        prog='make.d.py run',
+        description='Run command and append its timing to a trace file.')
+    parser.add_argument(
+        '-t', '--trace', action='store', required=True, dest='tracefile',
+        metavar='TraceFile', help='trace file to append to.')
+    parser.add_argument(
+        '-k', '--kind', action='store', default='compile', dest='kind',
+        metavar='Kind', help='kind of command: depend, compile, link.')
+    parser.add_argument(
+        '-n', '--target', action='store', default='', dest='target',
+        metavar='Target', help='target of make built by command.')
+    parser.add_argument(
+        'command', nargs=argparse.REMAINDER, metavar='Command',
+        help='command and its arguments, after --.')
+    args = parser.parse_args(argv)
+    command = args.command
+    if command and (command[0] == '--'):
+        command = command[1:]
+    if not command:
+        parser.error('no command given.')
+
+    sys.exit(run_traced(args.tracefile, args.kind,
+                        args.target or command[0], command))
+
+
+def read_trace(tracefile):
+    """
+    Read trace file written by run_traced
+
+    Parameters
+    ----------
+    tracefile : str
+        Trace file with one JSON record per line
+
+    Returns
+    -------
+    list of dict
+        Records sorted by start time; incomplete lines are skipped
+
+    """
+    import json
+    import codecs
+
+    tf = codecs.open(tracefile, 'r', encoding='utf-8')
+    records = []
+    for ll in tf:
+        try:
+            records.append(json.loads(ll))
+        except ValueError:
+            continue
+    tf.close()
+
+    return sorted(records, key=lambda rr: rr['start'])
+
+
+def trace_report(tracefile, outfile=None, timesfile=None, nslow=10,
+                 mingap=0.1):
+    """
+    Chrome trace and summary of a traced build
+
+    Writes the records of `tracefile` in Chrome trace event format,
+    which can be viewed with chrome://tracing or https://ui.perfetto.dev,
+    and prints the time spent in dependency generation, compilation, and
+    linking, the slowest targets, and the gaps where no job was running.
+
+    Parameters
+    ----------
+    tracefile : str
+        Trace file written by run_traced
+    outfile : str, optional
+        Output file in Chrome trace event format (JSON)
+    timesfile : str, optional
+        Output JSON file with the compile times of the object files,
+        which can be given to the sub-command schedule.
+    nslow : int, optional
+        Number of slowest targets and largest gaps reported (default: 10)
+    mingap : float, optional
+        Minimum time in seconds without jobs reported as gap
+        (default: 0.1)
+
+    Returns
+    -------
+    dict
+        'wall' (wall time), 'kinds' (dict of summed times per kind),
+        'slowest' (list of records), 'gaps' (list of (start, end) in
+        seconds since the begin of the build), 'idle' (summed gaps)
+
+    """
+    import os
+    import json
+
+    records = read_trace(tracefile)
+    if not records:
+        raise ValueError('No records in trace file: ' + tracefile)
+    t0   = records[0]['start']
+    wall = max([ rr['end'] for rr in records ]) - t0
+
+    # Lanes: first lane free at start of job, as threads in the viewer
+    lanes  = []
+    events = []
+    for rr in records:
+        for ll, lend in enumerate(lanes):
+            if lend <= rr['start']:
+                break
+        else:
+            ll = len(lanes)
+            lanes.append(0.)
+        lanes[ll] = rr['end']
+        args = {'target': rr['target'], 'compiler': rr['compiler'],
+                'status': rr['status']}
+        if rr.get('rss') is not None:
+            args['rss_kB'] = rr['rss']
+        events.append({'name': os.path.basename(rr['target']),
+                       'cat': rr['kind'], 'ph': 'X', 'pid': 1,
+                       'tid': ll + 1,
+                       'ts': int(round((rr['start'] - t0) * 1e6)),
+                       'dur': int(round((rr['end'] - rr['start']) * 1e6)),
+                       'args': args})
+    if outfile:
+        write_if_changed(outfile, json.dumps(
+            {'traceEvents': events, 'displayTimeUnit': 'ms'},
+            sort_keys=True) + '\n')
+
+    # Time per kind of job
+    kinds = dict()
+    for rr in records:
+        kinds[rr['kind']] = kinds.get(rr['kind'], 0.) + rr['end'] - rr['start']
+
+    # Gaps without any running job
+    gaps = []
+    tend = records[0]['end']
+    for rr in records[1:]:
+        if rr['start'] - tend >= mingap:
+            gaps.append((tend - t0, rr['start'] - t0))
+        tend = max(tend, rr['end'])
+    idle = sum([ gg[1] - gg[0] for gg in gaps ])
+
+    slowest = sorted(records, key=lambda rr: rr['start'] - rr['end'])[:nslow]
+
+    if timesfile:
+        times = dict()
+        for rr in records:
+            if rr['kind'] == 'compile':
+                times[rr['target']] = round(rr['end'] - rr['start'], 3)
+        write_if_changed(timesfile, json.dumps(times, indent=1,
+                                               sort_keys=True) + '\n')
+
+    print('Jobs: {:d}  wall time: {:.2f} s  lanes: {:d}'.format(
+        len(records), wall, len(lanes)))
+    for kk in sorted(kinds):
+        print('    {:8s} {:10.2f} s'.format(kk, kinds[kk]))
+    if wall > 0.:
+        print('Average parallelism: {:.2f}'.format(sum(kinds.values()) / wall))
+    print('Idle: {:.2f} s in {:d} gaps'.format(idle, len(gaps)))
+    for gg in sorted(gaps, key=lambda gg: gg[0] - gg[1])[:nslow]:
+        print('    {:10.2f} s at {:.2f} s'.format(gg[1] - gg[0], gg[0]))
+    print('Slowest:')
+    for rr in slowest:
+        rss = ''
+        if rr.get('rss') is not None:
+            rss = '  {:d} MB'.format(rr['rss'] // 1024)
+        print('    {:10.2f} s  {:s} ({:s}){:s}'.format(
+            rr['end'] - rr['start'], os.path.basename(rr['target']),
+            rr['kind'], rss))
+    if outfile:
+        print('Chrome trace: ' + outfile)
+
+    return {'wall': wall, 'kinds': kinds, 'slowest': slowest,
+            'gaps': gaps, 'idle': idle}
+
+
+def trace_main(argv):
+    """
+    Command line interface of trace: make.d.py trace [options] TraceFile
+    """
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        prog='make.d.py trace',
+        description='Write Chrome trace and summary of a traced build.')
+    parser.add_argument(
+        '-o', '--output', action='store', default=None, dest='outfile',
+        metavar='ChromeTraceFile',
+        help='output file in Chrome trace event format.')
+    parser.add_argument(
+        '-t', '--times', action='store', default=None, dest='timesfile',
+        metavar='TimesFile',
+        help='output JSON file with compile times for schedule -t.')
+    parser.add_argument(
+        '-n', action='store', type=int, default=10, dest='nslow',
+        metavar='N', help='number of slowest targets reported.')
+    parser.add_argument(
+        'tracefile', metavar='TraceFile',
+        help='trace file written by make.d.py run.')
+    args = parser.parse_args(argv)
+
+    trace_report(args.tracefile, outfile=args.outfile,
+                 timesfile=args.timesfile, nslow=args.nslow)
+
+
+def check_report(tracefiles, xmlfile=None):
+    """
+    Summary and JUnit XML report of the tests of make check
+
+    Each test directory has a trace file of run_traced with the build of
+    the test (kind 'build') and the run of its executable (kind 'run'),
+    and next to it the build log (.log) and the output of the executable
+    (.out). A test is o.k. if it was built and its executable finished
+    without error, writing o.k. and not failed.
+
+    Parameters
+    ----------
+    tracefiles : list of str
+        Trace files such as .check.gnu.debug/test_mo_kind.trace
+    xmlfile : str, optional
+        Output file with the results in JUnit XML format
+
+    Returns
+    -------
+    list of dict
+        'name', 'status' ('o.k.', 'failed', or 'error' if the build
+        failed), 'build' and 'run' time in seconds, 'output' of the
+        executable and 'log' of the build for each test
+
+    """
+    import os
+    import codecs
+    from xml.sax.saxutils import escape, quoteattr
+
+    def read_text(tfile):
+        if not os.path.exists(tfile):
+            return ''
+        tf = codecs.open(tfile, 'r', encoding='utf-8', errors='replace')
+        text = tf.read()
+        tf.close()
+        return text
+
+    results = list()
+    for tfile in sorted(tracefiles):
+        base = tfile[0:tfile.rfind('.')]
+        records = read_trace(tfile) if os.path.exists(tfile) else []
+        build = [ rr for rr in records if rr['kind'] == 'build' ]
+        run   = [ rr for rr in records if rr['kind'] == 'run' ]
+        output = read_text(base + '.out')
+        if (not build) or any([ rr['status'] != 0 for rr in build ]):
+            status = 'error'
+        elif ((not run) or (run[0]['status'] != 0) or
+              ('o.k.' not in output) or ('failed' in output)):
+            status = 'failed'
+        else:
+            status = 'o.k.'
+        results.append({
+            'name': os.path.basename(base), 'status': status,
+            'build': sum([ rr['end'] - rr['start'] for rr in build ]),
+            'run': sum([ rr['end'] - rr['start'] for rr in run ]),
+            'output': output, 'log': read_text(base + '.log')})
+
+    nlen = max([ len(rr['name']) for rr in results ] + [4])
+    for rr in results:
+        print('{:s}  {:6s}  build {:8.2f} s  run {:8.2f} s'.format(
+            rr['name'].ljust(nlen), rr['status'], rr['build'], rr['run']))
+    for rr in results:
+        if rr['status'] == 'failed':
+            print(rr['name'] + ' failed!')
+            for ll in rr['output'].split('\n'):
+                if ('o.k.' in ll) or ('failed' in ll):
+                    print('    ' + ll.strip())
+        elif rr['status'] == 'error':
+            print(rr['name'] + ' build failed!')
+            for ll in rr['log'].strip().split('\n')[-10:]:
+                print('    ' + ll)
+    nok = len([ rr for rr in results if rr['status'] == 'o.k.' ])
+    print('Tests: {:d}  o.k.: {:d}  failed: {:d}  build: {:.2f} s'
+          '  run: {:.2f} s'.format(
+              len(results), nok, len(results) - nok,
+              sum([ rr['build'] for rr in results ]),
+              sum([ rr['run'] for rr in results ])))
+
+    if xmlfile:
+        nfail = len([ rr for rr in results if rr['status'] == 'failed' ])
+        nerr  = len([ rr for rr in results if rr['status'] == 'error' ])
+        lines = ['<?xml version="1.0" encoding="UTF-8"?>',
+                 '<testsuite name="check" tests="{:d}" failures="{:d}"'
+                 ' errors="{:d}" time="{:.3f}">'.format(
+                     len(results), nfail, nerr,
+                     sum([ rr['build'] + rr['run'] for rr in results ]))]
+        for rr in results:
+            lines.append('  <testcase classname="check" name={:s}'
+                         ' time="{:.3f}">'.format(quoteattr(rr['name']),
+                                                  rr['build'] + rr['run']))
+            if rr['status'] == 'failed':
+                lines.append('    <failure message="test failed"/>')
+            elif rr['status'] == 'error':
+                lines.append('    <error message="build failed">'
+                             + escape(rr['log']) + '</error>')
+            lines.append('    <system-out>' + escape(rr['output'])
+                         + '</system-out>')
+            lines.append('  </testcase>')
+        lines.append('</testsuite>')
+        xf = codecs.open(xmlfile, 'w', encoding='utf-8')
+        xf.write('\n'.join(lines) + '\n')
+        xf.close()
+        print('JUnit XML: ' + xmlfile)
+
+    return results
+
+
+def check_main(argv):
+    """
+    Command line interface of check: make.d.py check [options] TraceFiles
+
+    Returns 1 if a test failed or could not be built, and 0 otherwise
+    so that make check fails.
+    """
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        prog='make.d.py check',
+        description='Summarise the tests of make check.')
+    parser.add_argument(
+        '-x', '--xml', action='store', default=None, dest='xmlfile',
+        metavar='XMLFile', help='output file in JUnit XML format.')
+    parser.add_argument(
+        'tracefiles', nargs='*', metavar='TraceFile',
+        help='trace files of the builds and runs of the tests.')
+    args = parser.parse_args(argv)
+
+    results = check_report(args.tracefiles, xmlfile=args.xmlfile)
+
+    return int(bool([ rr for rr in results if rr['status'] != 'o.k.' ]))
+
+
+def _which(prog):
+    """
+    Full path of a program, searched in PATH if it has no directory
+    """
+    import os
+
+    if os.path.dirname(prog):
+        return os.path.realpath(prog)
+    for dd in os.environ.get('PATH', '').split(os.pathsep):
+        pp = os.path.join(dd, prog)
+        if os.path.isfile(pp) and os.access(pp, os.X_OK):
+            return os.path.realpath(pp)
+
+    return prog
+
+
+def compiler_identity(compiler, cachedir):
+    """
+    Identity of a compiler given by its version output
+
+    The output of `compiler --version` is stored in `cachedir` for the
+    path, size, and modification time of the compiler executable so that
+    the compiler is only run once after each installation.
+
+    Parameters
+    ----------
+    compiler : str
+        Compiler command such as gfortran or /usr/bin/gfortran
+    cachedir : str
+        Directory of the object cache
+
+    Returns
+    -------
+    str
+        Path and version output of `compiler`
+
+    """
+    import os
+    import hashlib
+    import subprocess
+
+    path = _which(compiler)
+    try:
+        st  = os.stat(path)
+        tag = '{:s} {:d} {:.6f}'.format(path, st.st_size, st.st_mtime)
+    except OSError:
+        return path
+    ifile = os.path.join(cachedir, 'compilers',
+                         hashlib.sha1(tag.encode('utf-8')).hexdigest())
+    if os.path.exists(ifile):
+        fi = open(ifile, 'rb')
+        ident = fi.read().decode('utf-8', 'ignore')
+        fi.close()
+        return ident
+
+    try:
+        pp = subprocess.Popen([path, '--version'], stdout=subprocess.PIPE,
+                              stderr=subprocess.STDOUT)
+        out = pp.communicate()[0].decode('utf-8', 'ignore')
+    except OSError:
+        out = ''
+    ident = tag + '\n' + out
+    if not os.path.isdir(os.path.dirname(ifile)):
+        try:
+            os.makedirs(os.path.dirname(ifile))
+        except OSError:
+            pass
+    tfile = '{:s}.{:d}'.format(ifile, os.getpid())
+    fo = open(tfile, 'wb')
+    fo.write(ident.encode('utf-8'))
+    fo.close()
+    os.rename(tfile, ifile)
+
+    return ident
+
+
+def objcache_key(cachedir, compiler, ffile, command, basedir=None):
     """
-    List of files and the modules they provide
+    Key of the object cache for the compilation of one Fortran file
 
-    Makes a file that lists all Fortran90 source files and the modules they
-    provide in the form
-    .. code-block::
+    The key is a hash of the compiler identity, the command line, the
+    content of the Fortran file and all its include files, and the
+    interfaces of all module files that it uses. Module files are searched
+    in the directory of the object file and the -I directories of the
+    command. All pre-processor branches are scanned so that the key
+    changes with every module or include file that the file could use.
 
-       FortranFile: mo_mod1 mo_mod2
+    The key does not hash the pre-processed source, which would need one
+    run of the pre-processor per lookup. The raw source and its include
+    files are hashed together with the command line, which has all -D
+    definitions and -I directories of the Makefile. Macros and include
+    directories that the compiler takes from the environment, e.g. from
+    CPATH, are covered only through the command line, i.e. not at all if
+    they are not on it; such a build should not use the object cache.
 
     Parameters
     ----------
-    modfile : str
-        Output filename with list entries
-    srcfiles : list of str
-        List with Fortran90 files
+    cachedir : str
+        Directory of the object cache
+    compiler : str
+        Compiler name of the Makefile such as gnu, gnu41, intel2018.0,
+        oneapi, or nag62, see compiler_family
+    ffile : str
+        Fortran file
+    command : list of str
+        Compile command; its object file is given with -o
+    basedir : str, optional
+        Paths below `basedir` are taken relative to `basedir` so that
+        identical checkouts in different directories have the same keys.
 
     Returns
     -------
-    modfile with entries such as
-    .. code-block::
+    tuple
+        (key, record), key is a hex string and record the record of
+        scan_file of `ffile`
 
-       FortranFile: mo_mod1 mo_mod2
+    """
+    import os
+    import hashlib
 
+    def norm(arg):
+        if basedir:
+            return arg.replace(basedir.rstrip('/') + '/', '')
+        return arg
 
-    Notes
-    -----
-    Script assumes that the keyword 'module' and the module name are on the
-    same line in the Fortran files. That means it does not allow to start a
-    Fortran90 module like this:
-    .. code-block:: f90
+    ofile   = command[command.index('-o') + 1]
+    incdirs = [ cc[2:] for cc in command if cc.startswith('-I') ]
 
-        module &
-            mo_name ! this is a weird coding style
+    khash = hashlib.sha1(b'jams objcache 1\0')
+    khash.update(compiler_identity(command[0], cachedir).encode('utf-8'))
+    for cc in command[1:]:
+        khash.update(b'\0' + norm(cc).encode('utf-8'))
+
+    record = scan_file(ffile)
+    khash.update(b'\0source\0' + record['hash'].encode('ascii'))
+    for ii in resolve_includes(ffile, record['includes'], incdirs):
+        fi = open(ii, 'rb')
+        khash.update(b'\0include\0' + norm(ii).encode('utf-8') + b'\0'
+                     + hashlib.sha1(fi.read()).digest())
+        fi.close()
+
+    mdirs = [os.path.dirname(ofile)] + incdirs
+    for mm in sorted(set(record_uses(record))):
+        suff = '.smod' if '@' in mm else '.mod'
+        khash.update(b'\0module\0' + mm.encode('utf-8'))
+        for dd in mdirs:
+            mfile = os.path.join(dd, mm + suff)
+            if os.path.exists(mfile):
+                khash.update(
+                    hashlib.sha1(mod_interface(mfile, compiler)).digest())
+                break
+        else:
+            khash.update(b'missing')
+
+    return khash.hexdigest(), record
+
+
+def objcache_evict(subdir, maxsize):
+    """
+    Remove least recently used entries of the object cache
+
+    Parameters
+    ----------
+    subdir : str
+        One of the 16 subdirectories of the object cache
+    maxsize : float
+        Maximum size of `subdir` in bytes; entries are removed
+        until it is below 80% of `maxsize`
+
+    Returns
+    -------
+    int
+        Number of removed entries
 
     """
     import os
-    import re
-    import codecs
+    import shutil
 
-    if not os.path.exists(os.path.dirname(modfile)):
-        os.mkdir(os.path.dirname(modfile))
-    of = codecs.open(modfile, 'w', encoding='utf-8')
-    for ff in srcfiles:
-        # Go through line by line,
-        # remove comments and strings because the latter can include ';'.
-        # Then split at at ';', if given.
-        # The stripped line should start with 'module ' and there should
-        # be nothing after the module name,
-        # as for example in lines such as 'module procedure ...'
-        olist = list()
-        fi = codecs.open(ff, 'r', encoding='ascii', errors='ignore')
-        for line in fi:
-            ll = line.rstrip().lower()    # everything lower case
-            ll = re.sub('!.*$', '', ll)   # remove F90 comment
-            ll = re.sub('^c.*$', '', ll)  # remove F77 comments
-            ll = re.sub('".*?"', '', ll)  # remove "string"
-            ll = re.sub("'.*?'", '', ll)  # remove 'string'
-            # check if several commands are on one line
-            if ';' in ll:
-                lll = ll.split(';')
-            else:
-                lll = [ll]
-                for il in lll:
-                    iil = il.strip()
-                    # Line should start with 'module ' and there should be
-                    # nothing after the module name
-                    if iil.startswith('module '):
-                        imod = iil[7:].strip()      # remove 'module '
-                        if len(imod.split()) == 1:  # not 'module procedure'
-                            olist.append(imod)
-        fi.close()
-        # Line into dictionary file
-        if olist:
-            print(ff, ':', end='', sep='', file=of)
-            for ll in olist:
-                print('', ll, end='', file=of)
-            print('', file=of)
-    of.close()
+    entries = list()
+    total   = 0
+    for ee in os.listdir(subdir):
+        edir = os.path.join(subdir, ee)
+        if ee.startswith('tmp'):
+            continue
+        try:
+            size = sum([ os.path.getsize(os.path.join(edir, ff))
+                         for ff in os.listdir(edir) ])
+            entries.append((os.path.getmtime(edir), size, edir))
+        except OSError:
+            continue
+        total += size
+    if total <= maxsize:
+        return 0
 
-    return
+    nremoved = 0
+    for mtime, size, edir in sorted(entries):
+        if total <= 0.8 * maxsize:
+            break
+        shutil.rmtree(edir, ignore_errors=True)
+        total    -= size
+        nremoved += 1
+
+    return nremoved
 
 
-def get_dict(modfile):
+def objcache_compile(cachedir, maxsize, compiler, ffile, command,
+                     basedir=None):
     """
-    Return dictionary from file produced by make_dict
+    Compile a Fortran file or restore its output from the object cache
 
-    It return dictionary with module names as keys and filenames as values.
+    The object file and the module files produced by the compilation of
+    `ffile` are stored in `cachedir` under the key of objcache_key,
+    together with the messages of the compiler. A later compilation with
+    the same key, from any directory or checkout, restores the files
+    instead of running the compiler. Module files with unchanged content
+    are not rewritten so that their modification times do not change.
+
+    The cache has 16 subdirectories for the first hex digit of the keys.
+    Entries of one subdirectory are removed in order of their last use
+    if it exceeds 1/16 of `maxsize`, similar to ccache.
 
     Parameters
     ----------
-    modfile : str
-        File with entries such as
-        .. code-block::
+    cachedir : str
+        Directory of the object cache
+    maxsize : float
+        Maximum size of the object cache in MB
+    compiler : str
+        Compiler name of the Makefile such as gnu, gnu41, intel2018.0,
+        oneapi, or nag62, see compiler_family
+    ffile : str
+        Fortran file
+    command : list of str
+        Compile command; its object file is given with -o and the module
+        files are written into the directory of the object file.
+    basedir : str, optional
+        Paths below `basedir` are taken relative to `basedir` in the key
+
+    Returns
+    -------
+    int
+        Exit status of the compiler, 0 if restored from the cache
+
+    """
+    import os
+    import sys
+    import json
+    import shutil
+    import tempfile
+    import subprocess
+
+    ofile = command[command.index('-o') + 1]
+    odir  = os.path.dirname(ofile)
+    key, record = objcache_key(cachedir, compiler, ffile, command,
+                               basedir=basedir)
+    subdir = os.path.join(cachedir, key[0])
+    edir   = os.path.join(subdir, key[1:])
+
+    # hit
+    mfile = os.path.join(edir, 'manifest.json')
+    if os.path.exists(mfile):
+        try:
+            mf = open(mfile, 'rb')
+            manifest = json.loads(mf.read().decode('utf-8'))
+            mf.close()
+            for ff in manifest['files']:
+                cfile = os.path.join(edir, ff)
+                tfile = ofile if ff == 'object' else os.path.join(odir, ff)
+                if (ff != 'object') and os.path.exists(tfile):
+                    fi = open(tfile, 'rb')
+                    old = fi.read()
+                    fi.close()
+                    fi = open(cfile, 'rb')
+                    new = fi.read()
+                    fi.close()
+                    if old == new:
+                        continue
+                shutil.copyfile(cfile, tfile + '.objcache')
+                os.rename(tfile + '.objcache', tfile)
+            os.utime(edir, None)
+            if manifest['stderr']:
+                sys.stderr.write(manifest['stderr'])
+            return 0
+        except (IOError, OSError, ValueError, KeyError):
+            pass
+
+    # miss
+    pp = subprocess.Popen(command, stderr=subprocess.PIPE, close_fds=False)
+    err = pp.communicate()[1].decode('utf-8', 'replace')
+    sys.stderr.write(err)
+    if pp.returncode != 0:
+        return pp.returncode
+
+    files = ['object']
+    for mm in record_provides(record):
+        for suff in ['.mod', '.smod']:
+            if os.path.exists(os.path.join(odir, mm + suff)):
+                files.append(mm + suff)
+    try:
+        if not os.path.isdir(subdir):
+            os.makedirs(subdir)
+        tdir = tempfile.mkdtemp(prefix='tmp', dir=subdir)
+        for ff in files:
+            tfile = ofile if ff == 'object' else os.path.join(odir, ff)
+            shutil.copyfile(tfile, os.path.join(tdir, ff))
+        mf = open(os.path.join(tdir, 'manifest.json'), 'wb')
+        mf.write(json.dumps({'files': files, 'source': ffile,
+                             'stderr': err}).encode('utf-8'))
+        mf.close()
+        try:
+            os.rename(tdir, edir)
+        except OSError:
+            # stored by a parallel job in the meantime
+            shutil.rmtree(tdir, ignore_errors=True)
+        objcache_evict(subdir, maxsize * 1024. * 1024. / 16.)
+    except (IOError, OSError):
+        pass
+
+    return 0
+
+
+def objcache_stats(cachedir):
+    """
+    Print number of entries and size of the object cache
+
+    Parameters
+    ----------
+    cachedir : str
+        Directory of the object cache
+
+    """
+    import os
 
-           FortranFile: mo_mod1 mo_mod2
+    nentries = 0
+    size     = 0
+    for kk in '0123456789abcdef':
+        subdir = os.path.join(cachedir, kk)
+        if not os.path.isdir(subdir):
+            continue
+        for ee in os.listdir(subdir):
+            if ee.startswith('tmp'):
+                continue
+            edir = os.path.join(subdir, ee)
+            nentries += 1
+            size += sum([ os.path.getsize(os.path.join(edir, ff))
+                          for ff in os.listdir(edir) ])
+    print('Object cache: {:s}'.format(cachedir))
+    print('Entries: {:d}  size: {:.1f} MB'.format(nentries,
+                                                  size / 1024. / 1024.))
+
+
+def objcache_main(argv):
+    """
+    Command line interface of objcache:
+    make.d.py objcache [options] -- command ...
+    """
+    import sys
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        prog='make.d.py objcache',
+        description='Compile Fortran file or restore object and module'
+                    ' files from the object cache. Prints statistics of'
+                    ' the cache if no command is given.')
+    parser.add_argument(
+        '-d', '--dir', action='store', required=True, dest='cachedir',
+        metavar='CacheDir', help='directory of the object cache.')
+    parser.add_argument(
+        '-s', '--size', action='store', type=float, default=5000.,
+        dest='maxsize', metavar='MB',
+        help='maximum size of the object cache in MB (default: 5000).')
+    parser.add_argument(
+        '-c', '--compiler', action='store', default='', dest='compiler',
+        metavar='Compiler',
+        help='compiler name of the Makefile such as gnu or intel18.')
+    parser.add_argument(
+        '-f', '--file', action='store', default=None, dest='ffile',
+        metavar='FortranFile', help='Fortran file compiled by command.')
+    parser.add_argument(
+        '-b', '--basedir', action='store', default=None, dest='basedir',
+        metavar='Dir',
+        help='paths below Dir are taken relative to Dir in the keys.')
+    parser.add_argument(
+        'command', nargs=argparse.REMAINDER, metavar='Command',
+        help='compile command and its arguments, after --.')
+    args = parser.parse_args(argv)
+    command = args.command
+    if command and (command[0] == '--'):
+        command = command[1:]
+    if not command:
+        objcache_stats(args.cachedir)
+        sys.exit(0)
+    if (not args.ffile) or ('-o' not in command):
+        parser.error('Fortran file and -o in command needed.')
+
+    sys.exit(objcache_compile(args.cachedir, args.maxsize, args.compiler,
+                              args.ffile, command, basedir=args.basedir))
+
+
+def make_synthetic(srcdir, nfiles, fanin=3, hubs=1, lines=50, seed=1):
+    """
+    Write a synthetic Fortran project for benchmarking
+
+    The project has `nfiles` modules mo_bench<i>.f90 and a main program
+    main.f90. Module i uses the first `hubs` modules, such as a kind
+    module in real projects, and `fanin` randomly chosen modules
+    0 < j < i, so that the modules have no circular dependencies.
+    The use statements vary between the styles USE mod, ONLY: ...,
+    USE, INTRINSIC :: ..., several statements separated by ;,
+    and lower-case use :: mod.
+
+    Parameters
+    ----------
+    srcdir : str
+        Output directory, created if it does not exist
+    nfiles : int
+        Number of modules
+    fanin : int, optional
+        Number of random modules used by each module (default: 3)
+    hubs : int, optional
+        Number of modules used by all other modules (default: 1)
+    lines : int, optional
+        Number of lines in the body of each module (default: 50)
+    seed : int, optional
+        Seed of the random number generator (default: 1)
 
     Returns
     -------
-    dict
-        Dictionary with module names as keys and filenames as values,
-        e.g. dict['mo_kind'] = '/path/mo_kind.f90'
+    list of str
+        Fortran files of the project
 
     """
-    import codecs
+    import os
+    import random
 
-    odict = dict()
-    of = codecs.open(modfile, 'r', encoding='utf-8')
-    for line in of:
-        # Dictionary lines should be like:
-        # /path/filename.suffix: mo_mod1 mo_mod2
-        ll = line.rstrip().split(':')
-        fname = ll[0]
-        mods = ll[1].strip().split(' ')
-        for m in mods:
-            odict[m] = fname
-    of.close()
+    rng = random.Random(seed)
+    if not os.path.isdir(srcdir):
+        os.makedirs(srcdir)
+    files = list()
+    for ii in range(nfiles):
+        uses = list(range(min(hubs, ii)))
+        pool = list(range(min(hubs, ii), ii))
+        uses.extend(sorted(rng.sample(pool, min(fanin, len(pool)))))
+        text = ['! Synthetic module of make.d.py bench',
+                'MODULE mo_bench{:d}'.format(ii), '']
+        for kk, uu in enumerate(uses):
+            style = (ii + kk) % 4
+            if (style == 0) or (uu < hubs):
+                text.append('  USE mo_bench{:d}, ONLY: p_bench{:d}'.format(
+                    uu, uu))
+            elif style == 1:
+                text.append('  USE, INTRINSIC :: iso_fortran_env, ONLY:'
+                            ' int32 ; USE mo_bench{:d}'.format(uu))
+            elif style == 2:
+                text.append('  use :: mo_bench{:d}'.format(uu))
+            else:
+                text.append('  USE mo_bench{:d}'.format(uu))
+        text.extend(['', '  IMPLICIT NONE', '', '  PRIVATE', '',
+                     '  PUBLIC :: p_bench{:d}, s_bench{:d}'.format(ii, ii),
+                     '',
+                     '  INTEGER, PARAMETER :: p_bench{:d} = {:d}'.format(
+                         ii, ii + 1),
+                     '', 'CONTAINS', '',
+                     '  SUBROUTINE s_bench{:d}(x)'.format(ii), '',
+                     '    INTEGER, INTENT(INOUT) :: x', ''])
+        for ll in range(lines):
+            if ll % 2 == 0:
+                text.append('    ! use mo_none: comment line {:d}'.format(ll))
+            else:
+                text.append('    x = x + p_bench{:d}'.format(ii))
+        text.extend(['', '  END SUBROUTINE s_bench{:d}'.format(ii), '',
+                     'END MODULE mo_bench{:d}'.format(ii)])
+        ffile = os.path.join(srcdir, 'mo_bench{:d}.f90'.format(ii))
+        write_if_changed(ffile, '\n'.join(text) + '\n')
+        files.append(ffile)
+
+    last = list(range(max(0, nfiles - 5), nfiles))
+    text = ['! Synthetic program of make.d.py bench', 'PROGRAM main', '']
+    text.extend([ '  USE mo_bench{:d}, ONLY: s_bench{:d}'.format(uu, uu)
+                  for uu in last ])
+    text.extend(['', '  IMPLICIT NONE', '', '  INTEGER :: x', '',
+                 '  x = 0'])
+    text.extend([ '  CALL s_bench{:d}(x)'.format(uu) for uu in last ])
+    text.extend(["  WRITE(*,*) '-> test o.k.'", '', 'END PROGRAM main'])
+    ffile = os.path.join(srcdir, 'main.f90')
+    write_if_changed(ffile, '\n'.join(text) + '\n')
+    files.append(ffile)
 
-    return odict
+    return files
 
 
-def used_mods(ffile):
+def bench(sizes, outfile=None, fanin=3, hubs=1, lines=50, seed=1,
+          makecmd=None, workdir=None, compare=None):
     """
-    List of modules used in one Fortran90 file
+    Benchmark dependency generation on synthetic Fortran projects
+
+    Times for each number of files in `sizes`: make_dict, get_dict,
+    make_one_d for all files, make_d in batch mode without and with
+    scan cache, and, if `makecmd` is given, the first call of make
+    (dependency generation, with make -t instead of compilation) and
+    a call of make with nothing to be done.
 
     Parameters
     ----------
-    ffile : str
-        Fortran90 file name
+    sizes : list of int
+        Numbers of modules of the synthetic projects
+    outfile : str, optional
+        Output JSON file with the timings
+    fanin, hubs, lines, seed : int, optional
+        Parameters of make_synthetic
+    makecmd : list of str, optional
+        make command with the variables system, compiler, etc.;
+        SRCPATH and PROGPATH are appended
+    workdir : str, optional
+        Directory for the synthetic projects, which are kept.
+        A temporary directory is used and removed if not given.
+    compare : str, optional
+        JSON file of an earlier benchmark; ratios of the timings are
+        printed
 
     Returns
     -------
-    List of modules used in `ffile`
+    dict
+        'python', 'commit', 'date', 'parameters', and 'results', a list
+        of dictionaries with the timings in seconds for each size
 
     """
-    import re
-    import codecs
+    import os
+    import sys
+    import json
+    import time
+    import shutil
+    import tempfile
+    import subprocess
 
-    # Go through line by line,
-    # remove comments and strings because the latter can include ';'.
-    # Then split at at ';', if given.
-    # The stripped line should start with 'use '.
-    # After use should be the "module_name", ', intrinsic :: module_name', or
-    # ', non_intrinsic :: module_name'. We allow also to use ":: module_name"
-    # After module name should only be ', only: ...' or ', a ==> b'
-    olist = list()
-    of = codecs.open(ffile, 'r', encoding='ascii', errors='ignore')
-    for line in of:
-        ll = line.rstrip().lower()    # everything lower case
-        ll = re.sub('!.*$', '', ll)   # remove F90 comment
-        ll = re.sub('^c.*$', '', ll)  # remove F77 comments
-        ll = re.sub('".*?"', '', ll)  # remove "string"
-        ll = re.sub("'.*?'", '', ll)  # remove 'string'
-        # check if several commands are on one line
-        if ';' in ll:
-            lll = ll.split(';')
-        else:
-            lll = [ll]
-        for il in lll:
-            iil = il.strip()
-            # line should start with 'use '
-            if iil.startswith('use '):
-                iil = iil[4:].strip()  # remove 'use '
-                # skip intrinsic modules
-                if 'intrinsic' in iil:
-                    if 'non_intrinsic' in iil:
-                        iil = re.sub(', *non_intrinsic', '', iil)
-                        iil = iil.strip()
-                    else:
-                        continue  # skip to next in lll
-                if iil.startswith('::'):
-                    iil = iil[2:].strip()  # remove ':: '
-                # remove after ',' if rename-list or only-list
-                iil = re.sub(',.*$', '', iil)
-                olist.append(iil.strip())
-    of.close()
+    def timed(func, *args, **kwargs):
+        t0 = time.time()
+        func(*args, **kwargs)
+        return round(time.time() - t0, 4)
 
-    return olist
+    def call(cmd):
+        devnull = open(os.devnull, 'w')
+        status = subprocess.call(cmd, stdout=devnull, stderr=devnull)
+        devnull.close()
+        if status != 0:
+            raise ValueError('Command failed: ' + ' '.join(cmd))
 
+    tmpdir = workdir or tempfile.mkdtemp(prefix='make.d.bench.')
+    opath  = '.bench'
+    results = list()
+    try:
+        for nn in sizes:
+            sdir  = os.path.join(os.path.abspath(tmpdir),
+                                 'bench{:d}'.format(nn))
+            files = make_synthetic(sdir, nn, fanin=fanin, hubs=hubs,
+                                   lines=lines, seed=seed)
+            odir  = os.path.join(sdir, opath)
+            if os.path.isdir(odir):
+                shutil.rmtree(odir)
+            os.makedirs(odir)
+            srcfile = os.path.join(odir, 'make.d.srcs')
+            write_if_changed(srcfile, '\n'.join(files) + '\n')
+            res = {'files': len(files)}
+            res['make_dict'] = timed(make_dict, opath, files)
+            t0 = time.time()
+            moddict = get_dict([os.path.join(odir, MODINDEXFILE)]).merged()
+            res['get_dict'] = round(time.time() - t0, 4)
+            t0 = time.time()
+            for ff in files:
+                make_one_d(ff, ff, opath, moddict)
+            res['make_one_d'] = round(time.time() - t0, 4)
+            res['make_d_cold'] = timed(make_d, opath, [srcfile], batch=True)
+            res['make_d_warm'] = timed(make_d, opath, [srcfile], batch=True)
+            if makecmd:
+                cmd = list(makecmd) + ['SRCPATH=' + sdir, 'PROGPATH=' + sdir]
+                t0 = time.time()
+                call(cmd + ['-t'])
+                res['make_first'] = round(time.time() - t0, 4)
+                res['make_null'] = timed(call, cmd)
+            results.append(res)
+            print(' '.join([ '{:s}={}'.format(kk, res[kk])
+                             for kk in ['files', 'make_dict', 'get_dict',
+                                        'make_one_d', 'make_d_cold',
+                                        'make_d_warm', 'make_first',
+                                        'make_null'] if kk in res ]))
+    finally:
+        if not workdir:
+            shutil.rmtree(tmpdir, ignore_errors=True)
 
-def f2suff(forfile, opath, suff):
+    try:
+        pp = subprocess.Popen(['git', 'rev-parse', 'HEAD'],
+                              cwd=os.path.dirname(os.path.abspath(__file__)),
+                              stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        commit = pp.communicate()[0].decode('ascii', 'ignore').strip()
+    except OSError:
+        commit = ''
+    out = {'python': sys.version.split()[0], 'commit': commit,
+           'date': time.strftime('%Y-%m-%d %H:%M:%S'),
+           'parameters': {'fanin': fanin, 'hubs': hubs, 'lines': lines,
+                          'seed': seed},
+           'results': results}
+    if outfile:
+        write_if_changed(outfile, json.dumps(out, indent=1, sort_keys=True)
+                         + '\n')
+
+    if compare:
+        cf = open(compare, 'r')
+        old = json.load(cf)
+        cf.close()
+        oldres = dict([ (rr['files'], rr) for rr in old['results'] ])
+        print('Ratio to ' + compare + (' (' + old['commit'][:10] + ')'
+                                       if old.get('commit') else ''))
+        for res in results:
+            if res['files'] not in oldres:
+                continue
+            ores = oldres[res['files']]
+            print('files={:d} '.format(res['files']) + ' '.join(
+                [ '{:s}={:.2f}'.format(kk, res[kk] / ores[kk])
+                  for kk in sorted(res)
+                  if (kk != 'files') and (kk in ores) and (ores[kk] > 0.) ]))
+
+    return out
+
+
+def bench_main(argv):
     """
-    Construct output filename in opath with new suffix
+    Command line interface of bench: make.d.py bench [options] [-- make ...]
+    """
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        prog='make.d.py bench',
+        description='Benchmark dependency generation and null builds'
+                    ' on synthetic Fortran projects.')
+    parser.add_argument(
+        '-n', '--files', action='store', default='100,1000', dest='sizes',
+        metavar='N[,N...]',
+        help='comma-separated numbers of files (default: 100,1000).')
+    parser.add_argument(
+        '-f', '--fanin', action='store', type=int, default=3, dest='fanin',
+        metavar='N', help='random modules used by each module (default: 3).')
+    parser.add_argument(
+        '-u', '--hubs', action='store', type=int, default=1, dest='hubs',
+        metavar='N', help='modules used by all modules (default: 1).')
+    parser.add_argument(
+        '-l', '--lines', action='store', type=int, default=50, dest='lines',
+        metavar='N', help='lines in the body of each module (default: 50).')
+    parser.add_argument(
+        '-s', '--seed', action='store', type=int, default=1, dest='seed',
+        metavar='N', help='seed of the random number generator.')
+    parser.add_argument(
+        '-d', '--dir', action='store', default=None, dest='workdir',
+        metavar='Dir', help='keep synthetic projects in Dir.')
+    parser.add_argument(
+        '-o', '--output', action='store', default=None, dest='outfile',
+        metavar='JSONFile', help='output file with timings.')
+    parser.add_argument(
+        '-c', '--compare', action='store', default=None, dest='compare',
+        metavar='JSONFile',
+        help='print ratios to timings of an earlier benchmark.')
+    parser.add_argument(
+        'makecmd', nargs=argparse.REMAINDER, metavar='MakeCommand',
+        help='make command for timing make, after --.')
+    args = parser.parse_args(argv)
+    makecmd = args.makecmd
+    if makecmd and (makecmd[0] == '--'):
+        makecmd = makecmd[1:]
+
+    bench([ int(nn) for nn in args.sizes.split(',') ],
+          outfile=args.outfile, fanin=args.fanin, hubs=args.hubs,
+          lines=args.lines, seed=args.seed, makecmd=makecmd or None,
+          workdir=args.workdir, compare=args.compare)
+
+
+def pgo_profiles(profdir, objs, gensuffix='-gen', compiler='gfortran',
+                 dirs=None):
+    """
+    Put the profiles of a training run where the compiler looks for them
+
+    Object files compiled by gfortran with -fprofile-generate=profdir
+    write their profiles into profdir, under the absolute path of the
+    object file if it was given with absolute path, or else named by the
+    absolute path with / replaced by #. gfortran -fprofile-use looks for
+    the profile next to the object file. The profile of an object file
+    such as src/.gnu.pgo/mo_a.o is the one of src/.gnu.pgo-gen/mo_a.o.
+    Profiles of other object files cannot be used because gfortran checks
+    also the path of the source file.
+
+    ifort -prof-gen writes .dyn files into profdir, which -prof-use reads
+    from there; they are only counted. ifx -fprofile-instr-generate writes
+    raw profiles .profraw into profdir, which are merged with llvm-profdata
+    into profdir/default.profdata for -fprofile-instr-use. PGI -Mpfi writes
+    pgfi.out into the working directory of the training run; the newest
+    pgfi.out of the current directory and of `dirs` is copied into the
+    current directory, where -Mpfo reads it.
 
     Parameters
     ----------
-    forfile : str
-        Fortran90 file name
-    opath : str
-        Relative output path.
-        Script assumes output path: dirname(forfile)/opath
-    suff : str
-        Suffix of input file will be replaced by suff
+    profdir : str
+        Directory with the profiles of the training run
+    objs : list of str
+        Object files of the build using the profiles
+    gensuffix : str, optional
+        Suffix of the directory of the instrumented object files
+        (default: '-gen')
+    compiler : str, optional
+        Fortran compiler such as gfortran, ifort, ifx, or pgfortran
+        (default: gfortran)
+    dirs : list of str, optional
+        Working directories of the training run with pgfi.out of PGI,
+        e.g. the test directories of make check
 
     Returns
     -------
-    Name of output file in opath having new suffix
+    int
+        Number of object files with profile for gfortran, number of
+        profiles of the training run otherwise
 
     """
     import os
+    import glob
+    import shutil
+    import subprocess
 
-    idir  = os.path.dirname(forfile)
-    ifile = os.path.basename(forfile)
-    odir  = idir + '/' + opath
-    ofile = ifile[0:ifile.rfind('.')] + '.' + suff
+    name = os.path.basename(compiler)
+    if name.startswith('ifort'):
+        nprof = len(glob.glob(os.path.join(profdir, '*.dyn')))
+        print('Profiles: {:d} .dyn files in {:s}'.format(nprof, profdir))
+        return nprof
 
-    return odir + '/' + ofile
+    if name.startswith('ifx'):
+        raws = sorted(glob.glob(os.path.join(profdir, '*.profraw')))
+        if raws:
+            status = subprocess.call(
+                ['llvm-profdata', 'merge', '-output='
+                 + os.path.join(profdir, 'default.profdata')] + raws)
+            if status != 0:
+                raise ValueError('llvm-profdata could not merge the profiles'
+                                 ' in ' + profdir)
+        print('Profiles: {:d} .profraw files merged into {:s}'.format(
+            len(raws), os.path.join(profdir, 'default.profdata')))
+        return len(raws)
+
+    if name.startswith(('pgfortran', 'pgf90', 'pgf95')):
+        pfiles = [ os.path.join(dd, 'pgfi.out')
+                   for dd in ['.'] + list(dirs or [])
+                   if os.path.exists(os.path.join(dd, 'pgfi.out')) ]
+        if pfiles:
+            pfile = max(pfiles, key=os.path.getmtime)
+            if os.path.abspath(pfile) != os.path.abspath('pgfi.out'):
+                shutil.copy2(pfile, 'pgfi.out')
+            print('Profiles: pgfi.out of ' + os.path.dirname(pfile))
+        else:
+            print('Profiles: no pgfi.out')
+        return len(pfiles[:1])
 
+    nprof = 0
+    for obj in objs:
+        odir, oname = os.path.split(obj)
+        stem = os.path.splitext(oname)[0]
+        gobj = os.path.join(os.path.dirname(os.path.abspath(odir)),
+                            os.path.basename(odir) + gensuffix, stem)
+        pfile = os.path.join(profdir, gobj.lstrip('/') + '.gcda')
+        if not os.path.exists(pfile):
+            pfile = os.path.join(profdir, gobj.replace('/', '#') + '.gcda')
+        if not os.path.exists(pfile):
+            pfile = ''
+        gcda = os.path.join(odir, stem + '.gcda')
+        if pfile:
+            if not os.path.isdir(odir):
+                os.makedirs(odir)
+            shutil.copy2(pfile, gcda)
+            nprof += 1
+        elif os.path.exists(gcda):
+            os.remove(gcda)
+    print('Profiles: {:d} of {:d} object files'.format(nprof, len(objs)))
 
-def f2d(forfile, opath):
+    return nprof
+
+
+def pgo_main(argv):
     """
-    Shortcut for f2suff(forfile, opath, 'd')
+    Command line interface of pgo: make.d.py pgo [options] ObjFiles
     """
-    return f2suff(forfile, opath, 'd')
+    import argparse
 
+    parser = argparse.ArgumentParser(
+        prog='make.d.py pgo',
+        description='Put profiles of a training run where the compiler'
+                    ' looks for them.')
+    parser.add_argument(
+        '-d', '--profdir', action='store', required=True, dest='profdir',
+        metavar='ProfDir', help='directory with the profiles.')
+    parser.add_argument(
+        '-g', '--gensuffix', action='store', default='-gen',
+        dest='gensuffix', metavar='Suffix',
+        help='suffix of the directories of the instrumented object files'
+             ' (default: -gen).')
+    parser.add_argument(
+        '-c', '--compiler', action='store', default='gfortran',
+        dest='compiler', metavar='Compiler',
+        help='Fortran compiler: gfortran, ifort, ifx, or pgfortran'
+             ' (default: gfortran).')
+    parser.add_argument(
+        '-s', '--searchdir', action='append', default=[], dest='dirs',
+        metavar='Dir',
+        help='working directory of the training run with pgfi.out of PGI;'
+             ' can be given several times.')
+    parser.add_argument(
+        'objs', nargs='*', metavar='ObjFile',
+        help='object files compiled with the profiles.')
+    args = parser.parse_args(argv)
 
-def f2o(forfile, opath):
+    pgo_profiles(args.profdir, args.objs, gensuffix=args.gensuffix,
+                 compiler=args.compiler, dirs=args.dirs)
+
+
+class FileWatcher(object):
     """
-    Shortcut for f2suff(forfile, opath, 'o')
+    Changes of files in directories with inotify or by polling
+
+    Uses the Linux inotify interface via ctypes and falls back to
+    comparing modification times and sizes of the files every `interval`
+    seconds if inotify is not available or if polling is requested,
+    e.g. for directories on NFS, where inotify does not see changes
+    made on other computers.
+
+    Parameters
+    ----------
+    dirs : list of str
+        Directories to watch (not recursive)
+    suffixes : list of str, optional
+        Only files with these suffixes are reported. Default: all files
+    interval : float, optional
+        Polling interval in seconds (default: 1)
+    poll : bool, optional
+        Poll even if inotify is available (default: False)
+    files : list of str, optional
+        Files in `dirs` reported also without one of `suffixes` such as
+        include files; can be changed later in the attribute files
+
+    Examples
+    --------
+    >>> fw = FileWatcher(['src'], suffixes=['.f90'])
+    >>> while True:
+    ...     changed = fw.wait()
+    ...     print(changed)
+
     """
-    return f2suff(forfile, opath, 'o')
 
+    # inotify events: close after write, moved from/to, create, delete
+    INMASK = 0x008 | 0x040 | 0x080 | 0x100 | 0x200
+
+    def __init__(self, dirs, suffixes=None, interval=1., poll=False,
+                 files=None):
+        import os
+
+        self.dirs     = [ os.path.abspath(dd) for dd in dirs ]
+        self.suffixes = suffixes
+        self.files    = set([ os.path.abspath(ff) for ff in files or [] ])
+        self.interval = interval
+        self.fd       = None
+        self.wds      = dict()
+        if not poll:
+            self._init_inotify()
+        if self.fd is None:
+            self.snapshot = self._snapshot()
+
+    def _init_inotify(self):
+        import os
+        import sys
+        import ctypes
+        import ctypes.util
+
+        if not sys.platform.startswith('linux'):
+            return
+        try:
+            libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6',
+                               use_errno=True)
+            fd = libc.inotify_init()
+        except (OSError, AttributeError):
+            return
+        if fd < 0:
+            return
+        for dd in self.dirs:
+            wd = libc.inotify_add_watch(fd, dd.encode('utf-8'),
+                                        ctypes.c_uint32(self.INMASK))
+            if wd < 0:
+                os.close(fd)
+                self.wds = dict()
+                return
+            self.wds[wd] = dd
+        self.fd = fd
+
+    def _wanted(self, ffile):
+        import os
+
+        if (self.suffixes is None) or (ffile in self.files):
+            return True
+        return os.path.splitext(ffile)[1] in self.suffixes
+
+    def _snapshot(self):
+        import os
+
+        snap = dict()
+        for dd in self.dirs:
+            try:
+                files = os.listdir(dd)
+            except OSError:
+                continue
+            for ff in files:
+                ffile = os.path.join(dd, ff)
+                if not self._wanted(ffile):
+                    continue
+                try:
+                    st = os.stat(ffile)
+                except OSError:
+                    continue
+                snap[ffile] = (st.st_mtime, st.st_size)
+        return snap
+
+    def _read_events(self, timeout):
+        import os
+        import select
+        import struct
+
+        changed = set()
+        if not select.select([self.fd], [], [], timeout)[0]:
+            return changed
+        data = os.read(self.fd, 65536)
+        pos  = 0
+        while pos + 16 <= len(data):
+            wd, mask, cookie, nlen = struct.unpack_from('iIII', data, pos)
+            name = data[pos+16:pos+16+nlen].rstrip(b'\0').decode(
+                'utf-8', 'replace')
+            pos += 16 + nlen
+            if (wd in self.wds) and name:
+                ffile = os.path.join(self.wds[wd], name)
+                if self._wanted(ffile):
+                    changed.add(ffile)
+        return changed
+
+    def wait(self, settle=0.2):
+        """
+        Wait for changes of files
+
+        Waits until files change, and then until there were no further
+        changes for `settle` seconds so that all files saved together,
+        e.g. by a version control system, are reported together.
+
+        Returns
+        -------
+        set of str
+            Absolute paths of the changed, created, and removed files
+
+        """
+        import time
 
-def make_one_d(prefile, ffile, opath, moddict):
+        changed = set()
+        while True:
+            if self.fd is not None:
+                new = self._read_events(settle if changed else None)
+            else:
+                time.sleep(settle if changed else self.interval)
+                snap = self._snapshot()
+                new  = set([ ff for ff in set(snap) | set(self.snapshot)
+                             if snap.get(ff) != self.snapshot.get(ff) ])
+                self.snapshot = snap
+            if (not new) and changed:
+                return changed
+            changed |= new
+
+    def close(self):
+        """
+        Close inotify file descriptor
+        """
+        import os
+
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
+
+
+def _watch_update(changed, opath, srcfiles, records, graph, call, load,
+                  firewall=False, defines=None, incdirs=None):
     """
-    Make dependency files for Fortran90 projects
+    One rebuild of watch after changes of files
+
+    Files including changed include files are scanned again as well
+    because their #define can select other modules.
+    Returns the new srcfiles, records, and graph.
+    """
+    import os
+
+    isrc = set(srcfiles)
+    new  = [ ff for ff in changed
+             if (ff not in isrc) and os.path.exists(ff) ]
+    gone = [ ff for ff in changed
+             if (ff in isrc) and not os.path.exists(ff) ]
+    if new or gone:
+        # new lists of files, dependencies, and module indexes
+        call([], lists=True)
+        srcfiles, records = load()
+        graph = DependencyGraph(records, srcfiles=srcfiles, incdirs=incdirs)
+        return srcfiles, records, graph
+    fchanged = [ ff for ff in srcfiles
+                 if (ff in changed) or (changed & set(graph.includes(ff))) ]
+    if fchanged:
+        for ff in fchanged:
+            records[ff] = scan_file(ff, defines=defines, incdirs=incdirs)
+        graph = DependencyGraph(records, srcfiles=srcfiles, incdirs=incdirs)
+        make_dict(opath, srcfiles, records=records)
+        cdirs = set([ os.path.dirname(ff) for ff in fchanged ])
+        for dd in cdirs:
+            write_cache(dd + '/' + opath + '/' + CACHEFILE,
+                        dict([ (ff, records[ff]) for ff in srcfiles
+                               if os.path.dirname(ff) == dd ]),
+                        defines=defines)
+        write_graph(graph, opath, firewall=firewall)
+    # all makes unused files with prune=false
+    unused = set(graph.unused())
+    objs = [ f2o(ff, opath) for ff in graph.affected(changed)
+             if ff not in unused ]
+    call(objs + ['all'])
+
+    return srcfiles, records, graph
+
+
+def watch(opath, srcfilelist, makecmd, dirs=None, suffixes=None,
+          interval=1., poll=False, firewall=False, defines=None,
+          incdirs=None):
+    """
+    Keep the dependencies of Fortran files up to date and rebuild on change
+
+    The records of all Fortran files and their dependency graph are kept
+    in memory. If Fortran files or their include files change, only the
+    changed files and the files including them are scanned again,
+    the makefile with all dependencies, the reverse dependency index,
+    the module indexes and the scan caches are updated, and make is
+    called with the affected object files and then the default target
+    for the link. make is called with iwatch=true so that the Makefile
+    does not write the lists of files again. If files are created or
+    removed, make is called without it so that it makes new lists, which
+    are then read again.
 
     Parameters
     ----------
-    prefile : str
-        (Pre-processed) Fortran input file.
-    ffile : str
-        Original Fortran file name.
     opath : str
         Relative output directory.
         Script assumes compilation into dirname(ffile)/opath
-    moddict : dict
-        Dictionary keys are module names, values are module filenames
-
-    Returns
-    -------
-    dependency file written dirname(ffile)/opath/basename(ffile).d
+    srcfilelist : list of str
+        File(s) with list(s) of all Fortran files, written by make
+    makecmd : list of str
+        make command
+    dirs : list of str, optional
+        Source directories watched for new files.
+        Default: directories of the Fortran files
+    suffixes : list of str, optional
+        Suffixes of all source files; changes of other files are ignored.
+        Fortran files are the files in `srcfilelist`.
+    interval : float, optional
+        Polling interval in seconds (default: 1)
+    poll : bool, optional
+        Poll for changes instead of using inotify (default: False)
+    firewall : bool, optional
+        Write the makefile of firewall mode (default: False)
+    defines : list of str, optional
+        Pre-processor definitions such as given to make_d in batch mode
+    incdirs : list of str, optional
+        Include directories such as given to make_d in batch mode
 
     """
-    import codecs
+    import os
+    import subprocess
 
-    # List of modules used in input file
-    imods = used_mods(prefile)
+    cdefines = cpp_defines(defines or [])
 
-    # Query dictionary for filenames of modules used in fortran file.
-    # Remove own file name for circular dependencies if more than one
-    # module in fortran file.
-    if imods:
-        imodfiles = list()
-        for d in imods:
-            if d in moddict:  # otherwise external module such as netcdf
-                if moddict[d] != ffile:
-                    imodfiles.append(moddict[d])
-    else:
-        imodfiles = []
+    def call(goals, lists=False):
+        cmd = list(makecmd) + ([] if lists else ['iwatch=true']) + goals
+        print(' '.join(cmd[0:1] + goals) if goals else cmd[0])
+        return subprocess.call(cmd, close_fds=False)
 
-    # Write output .d file
-    dfile = f2d(ffile, opath)
-    ofile = f2o(ffile, opath)
-    df = codecs.open(dfile, 'w', encoding='utf-8')
-    print(dfile, ':', ffile, file=df)
-    print(ofile, ':', ffile + ' ' + dfile, end='', file=df)
-    for im in imodfiles:
-        print('', f2o(im, opath), end='', file=df)
-    print('', file=df)
-    df.close()
+    def load():
+        srcfiles = [ os.path.abspath(ff)
+                     for ff in read_srcfiles(srcfilelist) ]
+        records, scanned = scan_files(opath, srcfiles, defines=cdefines,
+                                      incdirs=incdirs)
+        return srcfiles, records
 
-    return
+    # first build also writes the lists of files
+    call([], lists=True)
+    srcfiles, records = load()
+    if not srcfiles:
+        raise ValueError('No Fortran files in ' + ' '.join(srcfilelist))
+    graph = DependencyGraph(records, srcfiles=srcfiles, incdirs=incdirs)
+    if dirs is None:
+        dirs = list()
+        for ff in srcfiles:
+            if os.path.dirname(ff) not in dirs:
+                dirs.append(os.path.dirname(ff))
+    dirs = [ os.path.abspath(dd) for dd in dirs ]
+    incfiles = set([ os.path.abspath(ii) for ff in srcfiles
+                     for ii in graph.includes(ff) ])
+    for ii in sorted(incfiles):
+        if os.path.dirname(ii) not in dirs:
+            dirs.append(os.path.dirname(ii))
+    fw = FileWatcher(dirs, suffixes=suffixes, interval=interval, poll=poll,
+                     files=incfiles)
+    print('Watching {:d} directories with {:s}; stop with Ctrl-C'.format(
+        len(dirs), 'polling' if fw.fd is None else 'inotify'))
+    try:
+        while True:
+            changed = fw.wait()
+            try:
+                srcfiles, records, graph = _watch_update(
+                    changed, opath, srcfiles, records, graph, call, load,
+                    firewall=firewall, defines=cdefines, incdirs=incdirs)
+                fw.files = set([ os.path.abspath(ii) for ff in srcfiles
+                                 for ii in graph.includes(ff) ])
+            except ValueError as err:
+                # e.g. duplicate modules; keep watching until fixed
+                print('Error: ' + str(err))
+    except KeyboardInterrupt:
+        print('')
+    finally:
+        fw.close()
+
+
+def watch_main(argv):
+    """
+    Command line interface of watch: make.d.py watch [options] ... -- make
+    """
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        prog='make.d.py watch',
+        description='Watch source files, keep the dependencies of Fortran'
+                    ' files up to date, and rebuild after changes.')
+    parser.add_argument(
+        '-d', '--dir', action='append', default=None, dest='dirs',
+        metavar='Dir', help='source directory watched for new files.')
+    parser.add_argument(
+        '-s', '--suffixes', action='store', default=None, dest='suffixes',
+        metavar='Suffixes',
+        help='whitespace separated suffixes of all source files.')
+    parser.add_argument(
+        '-p', '--poll', action='store', type=float, default=None,
+        dest='interval', metavar='Seconds',
+        help='poll every Seconds instead of using inotify, e.g. on NFS.')
+    parser.add_argument(
+        '-w', '--firewall', action='store_true', default=False,
+        dest='firewall', help='firewall mode, see make.d.py -w.')
+    parser.add_argument(
+        '-D', '--define', action='append', default=[], dest='defines',
+        metavar='Name[=Value]', help='pre-processor definition.')
+    parser.add_argument(
+        '-I', '--include', action='append', default=[], dest='incdirs',
+        metavar='Dir', help='directory to search for include files.')
+    parser.add_argument(
+        'opath', metavar='OutputPath', help='relative output directory.')
+    parser.add_argument(
+        'rest', nargs=argparse.REMAINDER,
+        metavar='FilesWithSourceFileList -- make',
+        help='file(s) with list(s) of Fortran files, and make command.')
+    args = parser.parse_args(argv)
+
+    if '--' not in args.rest:
+        parser.error('make command must be given after --.')
+    ii = args.rest.index('--')
+    srcfilelist = args.rest[:ii]
+    makecmd     = args.rest[ii+1:]
+    if (not srcfilelist) or (not makecmd):
+        parser.error('file lists and make command are needed.')
+
+    watch(args.opath, srcfilelist, makecmd, dirs=args.dirs,
+          suffixes=args.suffixes.split() if args.suffixes else None,
+          interval=args.interval or 1., poll=args.interval is not None,
+          firewall=args.firewall, defines=args.defines,
+          incdirs=args.incdirs)
 
 
 # main
-def make_d(opath, srcfilelist, prefile=None, ffile=None):
+def make_d(opath, srcfilelist, prefile=None, ffile=None, batch=False,
+           cpp=None, njobs=1, firewall=False, incdirs=None, defines=None,
+           prune=False):
     """
     Make dependency files for Fortran90 projects
 
@@ -324,35 +4743,61 @@ def make_d(opath, srcfilelist, prefile=None, ffile=None):
         Not-pre-processed Fortran file name.
         If not given, prefile will be used.
         Ignored if prefile is not given.
+    batch : bool, optional
+        If True, write the dependencies of all files in `srcfilelist`
+        into one makefile dirname(srcfilelist[0])/opath/make.d.mk
+        instead of one dependency file per Fortran file.
+        Ignored if prefile is given.
+    cpp : str, optional
+        Pre-processor command such as '/usr/bin/cpp -C -P -DNAME -I/path'.
+        Fortran files will be pre-processed with `cpp` before looking for
+        used modules.
+    njobs : int, optional
+        Number of parallel processes for scanning files if not called by
+        make with a jobserver.
+    firewall : bool, optional
+        If True, object files depend on stamp files of module interfaces
+        instead of object files in batch mode, written into
+        dirname(srcfilelist[0])/opath/make.d.firewall.mk (default: False)
+    incdirs : list of str, optional
+        Directories to search for include files, which are added as
+        dependencies of the object files
+    defines : list of str, optional
+        Pre-processor definitions such as ['__GFORTRAN__', 'NDIM=3'].
+        Pre-processor conditionals are evaluated with these definitions
+        in batch mode if `cpp` is not given.
+    prune : bool, optional
+        If True, list the Fortran files not needed by the main programs
+        in batch mode (default: False)
 
     Returns
     -------
-    modules file, dependency file
-        file with list of modules used in source files
-        dirname(srcfilelist[0])/opath/make.d.dict,
-        dependency file dirname(ffile)/opath/basename(ffile).d
+    module index files, dependency file
+        module index dirname(ffile)/opath/make.d.modules for each source
+        directory,
+        dependency file dirname(ffile)/opath/basename(ffile).d,
+        or dirname(srcfilelist[0])/opath/make.d.mk in batch mode
 
     """
     import os
-    import codecs
 
     # File names of source files from file list(s)
-    srcfiles = []
-    for ff in srcfilelist:
-        fs = codecs.open(ff, 'r', encoding='utf-8')
-        srcfiles.extend(fs.read().split('\n'))
-        fs.close()
-    srcfiles = [ ss for ss in srcfiles if ss.strip() != '' ]
+    srcfiles = read_srcfiles(srcfilelist)
 
-    # Only one file with list of files and their modules provided
-    # put into first object directory
+    # Makefiles of all files are put into first object directory
     firstdir = os.path.dirname(srcfiles[0])
-    modfile  = firstdir + '/' + opath + '/' + 'make.d.dict'
-    if not os.path.exists(modfile):
-        make_dict(modfile, srcfiles)
+
+    # Scan only new or changed files; other records come from the cache
+    if batch and (prefile is None) and (not cpp):
+        defines = cpp_defines(defines if defines else [])
+    else:
+        defines = None
+    records, scanned = scan_files(opath, srcfiles, cpp=cpp, njobs=njobs,
+                                  defines=defines, incdirs=incdirs)
+    modfiles = make_dict(opath, srcfiles, records=records)
 
     # Dictionary keys are module names, values are module filenames.
-    moddict = get_dict(modfile)
+    moddict = get_dict(modfiles, records=records, srcfiles=srcfiles)
 
     if prefile is not None:
         # If original Fortran source file ffile not given, use prefile.
@@ -367,10 +4812,15 @@ def make_d(opath, srcfilelist, prefile=None, ffile=None):
             else:
                 forfile = prefile
 
-        make_one_d(prefile, forfile, opath, moddict)
+        make_one_d(prefile, forfile, opath, moddict, incdirs=incdirs)
+    elif batch:
+        # All dependencies in one makefile
+        graph  = DependencyGraph(records, srcfiles=srcfiles, incdirs=incdirs)
+        write_graph(graph, opath, firewall=firewall, prune=prune)
     else:
         for dd in srcfiles:
-            make_one_d(dd, dd, opath, moddict)
+            make_one_d(dd, dd, opath, moddict, record=records[dd],
+                       incdirs=incdirs)
 
     return
 
@@ -379,11 +4829,51 @@ if __name__ == '__main__':
 
     import sys
 
+    # sub-commands
+    if (len(sys.argv) > 1) and (sys.argv[1] == 'manifest'):
+        manifest_main(sys.argv[2:])
+        sys.exit(0)
+    if (len(sys.argv) > 1) and (sys.argv[1] == 'schedule'):
+        schedule_main(sys.argv[2:])
+        sys.exit(0)
+    if (len(sys.argv) > 1) and (sys.argv[1] == 'affected'):
+        affected_main(sys.argv[2:])
+        sys.exit(0)
+    if (len(sys.argv) > 1) and (sys.argv[1] == 'run'):
+        run_main(sys.argv[2:])
+    if (len(sys.argv) > 1) and (sys.argv[1] == 'trace'):
+        trace_main(sys.argv[2:])
+        sys.exit(0)
+    if (len(sys.argv) > 1) and (sys.argv[1] == 'objcache'):
+        objcache_main(sys.argv[2:])
+    if (len(sys.argv) > 1) and (sys.argv[1] == 'check'):
+        sys.exit(check_main(sys.argv[2:]))
+    if (len(sys.argv) > 1) and (sys.argv[1] == 'bench'):
+        bench_main(sys.argv[2:])
+        sys.exit(0)
+    if (len(sys.argv) > 1) and (sys.argv[1] == 'pgo'):
+        pgo_main(sys.argv[2:])
+        sys.exit(0)
+    if (len(sys.argv) > 1) and (sys.argv[1] == 'watch'):
+        watch_main(sys.argv[2:])
+        sys.exit(0)
+
     if sys.version.split()[0] < '2.7':
         import optparse  # deprecated with Python rev 2.7
 
         prefile = None
         ffile   = None
+        batch   = False
+        cpp     = None
+        njobs   = 1
+        firewall = False
+        prune   = False
+        stamp   = None
+        incdirs = []
+        defines = None
+        srcmap  = None
+        exclude = ''
+        compiler = ''
         usage  = ('Make dependency files for Fortran90 projects.\n'
                   'Usage: %prog [options] InputFile OutputPath'
                   ' FilesWithSourceFileList')
@@ -399,16 +4889,87 @@ if __name__ == '__main__':
                 ' ignored if InputFile is not given.')
         parser.add_option('-f', '--ffile', action='store', default=ffile,
                           dest='ffile', metavar='FortranFile', help=hstr)
+        hstr = ('Batch mode: make one makefile with all dependencies;'
+                ' ignored if InputFile is given.')
+        parser.add_option('-b', '--batch', action='store_true',
+                          default=batch, dest='batch', help=hstr)
+        hstr = ('External pre-processor command used in batch mode instead'
+                ' of evaluating conditionals, e.g. "cpp -C -P -DNAME".')
+        parser.add_option('-c', '--cpp', action='store', default=cpp,
+                          dest='cpp', metavar='CPP', help=hstr)
+        hstr = ('Number of parallel processes for scanning files'
+                ' if not called by make with a jobserver.')
+        parser.add_option('-j', '--jobs', action='store', type='int',
+                          default=njobs, dest='njobs', metavar='N',
+                          help=hstr)
+        hstr = ('Firewall mode: object files depend on stamp files of'
+                ' module interfaces; used with batch mode.')
+        parser.add_option('-w', '--firewall', action='store_true',
+                          default=firewall, dest='firewall', help=hstr)
+        hstr = ('List Fortran files not needed by the main programs;'
+                ' used with batch mode.')
+        parser.add_option('-p', '--prune', action='store_true',
+                          default=prune, dest='prune', help=hstr)
+        hstr = ('Write stamp file of module interfaces for Compiler;'
+                ' arguments are then StampFile ModuleFiles.')
+        parser.add_option('-s', '--stamp', action='store', default=stamp,
+                          dest='stamp', metavar='Compiler', help=hstr)
+        hstr = ('Directory to search for include files;'
+                ' can be given several times.')
+        parser.add_option('-I', '--include', action='append',
+                          default=incdirs, dest='incdirs', metavar='Dir',
+                          help=hstr)
+        hstr = ('Pre-processor definition for evaluating conditionals'
+                ' in batch mode; can be given several times.')
+        parser.add_option('-D', '--define', action='append',
+                          default=defines, dest='defines',
+                          metavar='Name[=Value]', help=hstr)
+        hstr = ('Write makefile with source file of each object file;'
+                ' arguments are then pairs of files with lists of source'
+                ' and object files.')
+        parser.add_option('-m', '--srcmap', action='store', default=srcmap,
+                          dest='srcmap', metavar='MapFile', help=hstr)
+        hstr = ('Source files compiled without realloc-lhs of Intel;'
+                ' used with srcmap.')
+        parser.add_option('-x', '--exclude', action='store',
+                          default=exclude, dest='exclude', metavar='Files',
+                          help=hstr)
+        hstr = ('Compiler of make.config such as intel2020 for the flags of'
+                ' Files of --exclude; used with srcmap.')
+        parser.add_option('--compiler', action='store', default=compiler,
+                          dest='compiler', metavar='Compiler', help=hstr)
 
         (options, args) = parser.parse_args()
         prefile = options.prefile
         ffile   = options.ffile
+        batch   = options.batch
+        cpp     = options.cpp
+        njobs   = options.njobs
+        firewall = options.firewall
+        prune   = options.prune
+        stamp   = options.stamp
+        incdirs = options.incdirs
+        defines = options.defines
+        srcmap  = options.srcmap
+        exclude = options.exclude
+        compiler = options.compiler
         allin   = args
     else:
         import argparse
 
         prefile = None
         ffile   = None
+        batch   = False
+        cpp     = None
+        njobs   = 1
+        firewall = False
+        prune   = False
+        stamp   = None
+        incdirs = []
+        defines = None
+        srcmap  = None
+        exclude = ''
+        compiler = ''
         parser  = argparse.ArgumentParser(
             formatter_class=argparse.RawDescriptionHelpFormatter,
             description='Make dependency files for Fortran90 projects.')
@@ -424,6 +4985,62 @@ if __name__ == '__main__':
         parser.add_argument(
             '-f', '--ffile', action='store', default=ffile, dest='ffile',
             metavar='OriginalFortranFile', help=hstr)
+        hstr = ('batch mode: make one makefile with all dependencies;'
+                ' ignored if InputFile is given.')
+        parser.add_argument(
+            '-b', '--batch', action='store_true', default=batch,
+            dest='batch', help=hstr)
+        hstr = ('external pre-processor command used in batch mode instead'
+                ' of evaluating conditionals, e.g. "cpp -C -P -DNAME".')
+        parser.add_argument(
+            '-c', '--cpp', action='store', default=cpp, dest='cpp',
+            metavar='CPP', help=hstr)
+        hstr = ('number of parallel processes for scanning files'
+                ' if not called by make with a jobserver.')
+        parser.add_argument(
+            '-j', '--jobs', action='store', type=int, default=njobs,
+            dest='njobs', metavar='N', help=hstr)
+        hstr = ('firewall mode: object files depend on stamp files of'
+                ' module interfaces; used with batch mode.')
+        parser.add_argument(
+            '-w', '--firewall', action='store_true', default=firewall,
+            dest='firewall', help=hstr)
+        hstr = ('list Fortran files not needed by the main programs;'
+                ' used with batch mode.')
+        parser.add_argument(
+            '-p', '--prune', action='store_true', default=prune,
+            dest='prune', help=hstr)
+        hstr = ('write stamp file of module interfaces for Compiler;'
+                ' arguments are then StampFile ModuleFiles.')
+        parser.add_argument(
+            '-s', '--stamp', action='store', default=stamp, dest='stamp',
+            metavar='Compiler', help=hstr)
+        hstr = ('directory to search for include files;'
+                ' can be given several times.')
+        parser.add_argument(
+            '-I', '--include', action='append', default=incdirs,
+            dest='incdirs', metavar='Dir', help=hstr)
+        hstr = ('pre-processor definition for evaluating conditionals'
+                ' in batch mode; can be given several times.')
+        parser.add_argument(
+            '-D', '--define', action='append', default=defines,
+            dest='defines', metavar='Name[=Value]', help=hstr)
+        hstr = ('write makefile with source file of each object file;'
+                ' arguments are then pairs of files with lists of source'
+                ' and object files.')
+        parser.add_argument(
+            '-m', '--srcmap', action='store', default=srcmap, dest='srcmap',
+            metavar='MapFile', help=hstr)
+        hstr = ('source files compiled without realloc-lhs of Intel;'
+                ' used with srcmap.')
+        parser.add_argument(
+            '-x', '--exclude', action='store', default=exclude,
+            dest='exclude', metavar='Files', help=hstr)
+        hstr = ('compiler of make.config such as intel2020 for the flags of'
+                ' Files of --exclude; used with srcmap.')
+        parser.add_argument(
+            '--compiler', action='store', default=compiler, dest='compiler',
+            metavar='Compiler', help=hstr)
         hstr = ('relative output directory (script assumes compilation into'
                 ' dirname(OriginalFortranFile)/OutputPath),'
                 ' file(s) with list(s) of all source files.')
@@ -434,8 +5051,29 @@ if __name__ == '__main__':
         args    = parser.parse_args()
         prefile = args.prefile
         ffile   = args.ffile
+        batch   = args.batch
+        cpp     = args.cpp
+        njobs   = args.njobs
+        firewall = args.firewall
+        prune   = args.prune
+        stamp   = args.stamp
+        incdirs = args.incdirs
+        defines = args.defines
+        srcmap  = args.srcmap
+        exclude = args.exclude
+        compiler = args.compiler
         allin   = args.files
 
+    if stamp is not None:
+        if len(allin) < 1:
+            raise IOError('Stamp mode needs: StampFile [ModuleFiles].')
+        write_stamp(allin[0], allin[1:], stamp)
+        sys.exit(0)
+
+    if srcmap is not None:
+        make_srcmap(srcmap, allin, exclude=exclude, compiler=compiler)
+        sys.exit(0)
+
     if len(allin) < 2:
         print('Arguments: ', allin)
         estr = 'Script needs: OutputPath FilesWithSourceFileList.'
@@ -446,4 +5084,11 @@ if __name__ == '__main__':
 
     del parser, args
 
-    make_d(opath, srcfilelist, prefile=prefile, ffile=ffile)
+    try:
+        make_d(opath, srcfilelist, prefile=prefile, ffile=ffile, batch=batch,
+               cpp=cpp, njobs=njobs, firewall=firewall, incdirs=incdirs,
+               defines=defines, prune=prune)
+    except ValueError as e:
+        # e.g. modules provided by more than one file
+        print('Error: ' + str(e), file=sys.stderr)
+        sys.exit(1)
@@ -0,0 +1,16 @@
+! Test of firewall=true: make check touches mo_body.f90 and mo_user.f90, i.e.
+! edits their implementations without changing the module interfaces.
+! Only these two files must be compiled again, not main.f90.
+program firewall
+
+  use mo_user, only: twice
+
+  implicit none
+
+  if (twice(2) == 4) then
+     print*, 'o.k.'
+  else
+     print*, 'failed'
+  endif
+
+end program firewall
@@ -0,0 +1,20 @@
+module mo_body
+
+  implicit none
+
+  private
+
+  public :: add
+
+contains
+
+  function add(i, j)
+
+    integer, intent(in) :: i, j
+    integer :: add
+
+    add = i + j
+
+  end function add
+
+end module mo_body
@@ -0,0 +1,22 @@
+module mo_user
+
+  use mo_body, only: add
+
+  implicit none
+
+  private
+
+  public :: twice
+
+contains
+
+  function twice(i)
+
+    integer, intent(in) :: i
+    integer :: twice
+
+    twice = add(i, i)
+
+  end function twice
+
+end module mo_user
@@ -0,0 +1,2 @@
+/* Selects the module used in main.f90 */
+#define USEB
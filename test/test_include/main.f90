@@ -0,0 +1,16 @@
+! Test of modules selected by #define in an include file:
+! main.f90 must depend on mo_b.f90 if defs.h defines USEB, otherwise on mo_a.f90.
+#include "defs.h"
+program include
+
+#ifdef USEB
+  use mo_b, only: hello
+#else
+  use mo_a, only: hello
+#endif
+
+  implicit none
+
+  call hello()
+
+end program include
@@ -0,0 +1,220 @@
+#!/usr/bin/env python
+"""
+Tests of the pre-processor evaluator and the dependency graph of make.d.py
+
+The Fortran test directories test/test* check the whole build with make
+check. This script checks the parts of make.d.py that decide which
+dependencies are written, without compiler:
+
+    python test/test_make_d.py
+
+or with pytest.
+"""
+from __future__ import division, absolute_import, print_function
+import os
+import shutil
+import tempfile
+import unittest
+
+
+def _load_maked():
+    """
+    Load make.config/make.d.py, which cannot be imported by its name
+    """
+    path = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                        os.pardir, 'make.config', 'make.d.py')
+    try:
+        import importlib.util
+        spec = importlib.util.spec_from_file_location('maked', path)
+        mod  = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(mod)
+    except ImportError:
+        import imp  # Python 2
+        mod = imp.load_source('maked', path)
+
+    return mod
+
+
+maked = _load_maked()
+
+
+def _record(provides=(), uses=(), submodules=(), programs=()):
+    """
+    Record of scan_fortran of a file without include files
+    """
+    return {'provides': list(provides), 'uses': list(uses),
+            'submodules': [ list(ss) for ss in submodules ],
+            'includes': [], 'programs': list(programs)}
+
+
+class TestCppExpression(unittest.TestCase):
+
+    def test_arithmetic(self):
+        self.assertEqual(maked.cpp_expression('1 + 2 * 3 == 7', {}), 1)
+        self.assertEqual(maked.cpp_expression('(1 + 2) * 3', {}), 9)
+        self.assertEqual(maked.cpp_expression('0x10 >> 2 == 4', {}), 1)
+        self.assertEqual(maked.cpp_expression('010 == 8', {}), 1)
+        self.assertEqual(maked.cpp_expression('-1 < 0 && ~0 == -1', {}), 1)
+        self.assertEqual(maked.cpp_expression('7 % 4 == 3 || 0', {}), 1)
+
+    def test_defined(self):
+        macros = {'A': '1'}
+        self.assertEqual(maked.cpp_expression('defined(A)', macros), 1)
+        self.assertEqual(maked.cpp_expression('defined A', macros), 1)
+        self.assertEqual(maked.cpp_expression('!defined(B)', macros), 1)
+        self.assertEqual(
+            maked.cpp_expression('defined(A) && defined(B)', macros), 0)
+
+    def test_macros(self):
+        macros = {'A': 'B + 1', 'B': '2', 'ZERO': '0'}
+        self.assertEqual(maked.cpp_expression('A == 3', macros), 1)
+        self.assertEqual(maked.cpp_expression('ZERO ? 2 : 3', macros), 3)
+        # undefined identifiers are 0
+        self.assertEqual(maked.cpp_expression('UNDEFINED + 1', macros), 1)
+        # self-referencing macros are not expanded again
+        self.assertEqual(maked.cpp_expression('C', {'C': 'C + 1'}), 1)
+
+    def test_not_evaluable(self):
+        self.assertIsNone(maked.cpp_expression('F(1)', {'F': None}))
+        self.assertIsNone(maked.cpp_expression('1 / 0', {}))
+        self.assertIsNone(maked.cpp_expression('(1', {}))
+        self.assertIsNone(maked.cpp_expression('1 2', {}))
+        self.assertIsNone(maked.cpp_expression('"a"', {}))
+
+
+class TestCppFilter(unittest.TestCase):
+
+    def active(self, text, macros=None, **kwargs):
+        """
+        Stripped active lines of `text` that are not directives
+        """
+        out = maked.cpp_filter(text, {} if macros is None else macros,
+                               **kwargs)
+        return [ ll.strip() for ll in out.split('\n')
+                 if ll.strip() and not ll.strip().startswith('#') ]
+
+    def test_branches(self):
+        text = ('#if NDIM == 1\none\n#elif NDIM == 2\ntwo\n'
+                '#else\nother\n#endif\nall\n')
+        self.assertEqual(self.active(text, {'NDIM': '1'}), ['one', 'all'])
+        self.assertEqual(self.active(text, {'NDIM': '2'}), ['two', 'all'])
+        self.assertEqual(self.active(text, {'NDIM': '3'}), ['other', 'all'])
+
+    def test_ifdef_define_undef(self):
+        text = ('#define A\n#ifdef A\na\n#endif\n#undef A\n'
+                '#ifndef A\nnot_a\n#endif\n')
+        self.assertEqual(self.active(text), ['a', 'not_a'])
+
+    def test_nested_inactive(self):
+        # directives in inactive branches are not evaluated
+        text = ('#ifdef NO\n#define A\n#if 1\nx\n#else\ny\n#endif\n'
+                '#else\nz\n#endif\n#ifdef A\na\n#endif\n')
+        self.assertEqual(self.active(text), ['z'])
+
+    def test_continuation_comment(self):
+        text = '#if defined(A) && \\\n    defined(B) /* both */\nab\n#endif\n'
+        self.assertEqual(self.active(text, {'A': '', 'B': ''}), ['ab'])
+        self.assertEqual(self.active(text, {'A': ''}), [])
+
+    def test_not_evaluable(self):
+        # branch and later branches are kept so that no module is missed
+        text = '#if 0\nzero\n#elif F(1)\nf\n#else\nother\n#endif\n'
+        self.assertEqual(self.active(text, {'F': None}), ['f', 'other'])
+        # until a branch that is taken for sure
+        text = ('#if F(1)\nf\n#elif 1\none\n#else\nother\n#endif\n')
+        self.assertEqual(self.active(text, {'F': None}), ['f', 'one'])
+
+    def test_include(self):
+        tmpdir = tempfile.mkdtemp()
+        try:
+            hfile = os.path.join(tmpdir, 'defs.h')
+            hf = open(hfile, 'w')
+            hf.write('#define USEB\n')
+            hf.close()
+            ffile = os.path.join(tmpdir, 'main.f90')
+            text = ('#include "defs.h"\n#ifdef USEB\nuse mo_b\n'
+                    '#else\nuse mo_a\n#endif\n')
+            self.assertEqual(self.active(text, ffile=ffile), ['use mo_b'])
+            # include file not found
+            self.assertEqual(self.active(text), ['use mo_a'])
+        finally:
+            shutil.rmtree(tmpdir)
+
+
+class TestDependencyGraph(unittest.TestCase):
+
+    def test_levels_order(self):
+        # a uses b and c, which both use d
+        records = {'a.f90': _record(uses=['mo_b', 'mo_c'], programs=['a']),
+                   'b.f90': _record(provides=['mo_b'], uses=['mo_d']),
+                   'c.f90': _record(provides=['mo_c'], uses=['mo_d']),
+                   'd.f90': _record(provides=['mo_d'], uses=['netcdf'])}
+        files = ['a.f90', 'b.f90', 'c.f90', 'd.f90']
+        graph = maked.DependencyGraph(records, srcfiles=files)
+        self.assertEqual(graph.dependencies('a.f90'), ['b.f90', 'c.f90'])
+        self.assertEqual(graph.dependents('d.f90'), ['b.f90', 'c.f90'])
+        self.assertEqual(graph.levels(),
+                         [['d.f90'], ['b.f90', 'c.f90'], ['a.f90']])
+        order = graph.order()
+        for ff in files:
+            for dd in graph.dependencies(ff):
+                self.assertLess(order.index(dd), order.index(ff))
+        self.assertEqual(graph.cycles(), [])
+        self.assertEqual(graph.cycle_report(), '')
+
+    def test_cycles(self):
+        records = {'x.f90': _record(provides=['mo_x'], uses=['mo_y']),
+                   'y.f90': _record(provides=['mo_y'], uses=['mo_z']),
+                   'z.f90': _record(provides=['mo_z'], uses=['mo_x']),
+                   'w.f90': _record(provides=['mo_w'], uses=['mo_x'])}
+        files = ['w.f90', 'x.f90', 'y.f90', 'z.f90']
+        graph = maked.DependencyGraph(records, srcfiles=files)
+        self.assertEqual(graph.cycles(),
+                         [['x.f90', 'y.f90', 'z.f90', 'x.f90']])
+        self.assertEqual(graph.cycle_report(),
+                         'x.f90 --(mo_y)--> y.f90 --(mo_z)--> z.f90'
+                         ' --(mo_x)--> x.f90')
+        self.assertRaises(ValueError, graph.levels)
+        # files in cycles are still ordered
+        self.assertEqual(sorted(graph.order()), sorted(files))
+
+    def test_submodules(self):
+        # sm_b is a submodule of sm_a, which is a submodule of mo_s
+        records = {
+            'main.f90': _record(uses=['mo_s'], programs=['main']),
+            'mo_s.f90': _record(provides=['mo_s']),
+            'sm_a.f90': _record(submodules=[['sm_a', 'mo_s', None]]),
+            'sm_b.f90': _record(submodules=[['sm_b', 'mo_s', 'sm_a']])}
+        files = ['main.f90', 'mo_s.f90', 'sm_a.f90', 'sm_b.f90']
+        graph = maked.DependencyGraph(records, srcfiles=files)
+        self.assertEqual(graph.dependencies('main.f90'), ['mo_s.f90'])
+        self.assertEqual(graph.dependencies('sm_a.f90'), ['mo_s.f90'])
+        self.assertEqual(graph.dependencies('sm_b.f90'),
+                         ['mo_s.f90', 'sm_a.f90'])
+        self.assertEqual(graph.levels(), [['mo_s.f90'],
+                                          ['main.f90', 'sm_a.f90'],
+                                          ['sm_b.f90']])
+        self.assertEqual(graph.unused(), [])
+
+    def test_unused(self):
+        records = {
+            'main.f90': _record(uses=['mo_a'], programs=['main']),
+            'mo_a.f90': _record(provides=['mo_a']),
+            'sm_a.f90': _record(submodules=[['sm_a', 'mo_a', None]]),
+            'ext.f90':  _record(uses=['mo_x']),
+            'mo_x.f90': _record(provides=['mo_x']),
+            'mo_u.f90': _record(provides=['mo_u'], uses=['mo_v']),
+            'mo_v.f90': _record(provides=['mo_v'])}
+        files = ['main.f90', 'mo_a.f90', 'sm_a.f90', 'ext.f90', 'mo_x.f90',
+                 'mo_u.f90', 'mo_v.f90']
+        graph = maked.DependencyGraph(records, srcfiles=files)
+        self.assertEqual(graph.programs(), ['main.f90'])
+        self.assertEqual(graph.unused(), ['mo_u.f90', 'mo_v.f90'])
+        # nothing is unused without main program, e.g. for libraries
+        del records['main.f90']
+        graph = maked.DependencyGraph(records, srcfiles=files[1:])
+        self.assertEqual(graph.unused(), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
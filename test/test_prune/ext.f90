@@ -0,0 +1,10 @@
+! External procedure without module using a module not used by the main program
+subroutine ext()
+
+  use mo_x, only: hello
+
+  implicit none
+
+  call hello()
+
+end subroutine ext
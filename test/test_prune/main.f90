@@ -0,0 +1,11 @@
+! Test of prune=true: the external procedure in ext.f90 uses the module mo_x,
+! which is not used by the main program. mo_unused.f90 is not needed.
+program prune
+
+  implicit none
+
+  external :: ext
+
+  call ext()
+
+end program prune
@@ -0,0 +1,18 @@
+! Not needed by the main program: skipped with prune=true
+module mo_unused
+
+  implicit none
+
+  private
+
+  public :: unused
+
+contains
+
+  subroutine unused()
+
+    print*, 'failed'
+
+  end subroutine unused
+
+end module mo_unused
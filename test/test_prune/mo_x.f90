@@ -0,0 +1,17 @@
+module mo_x
+
+  implicit none
+
+  private
+
+  public :: hello
+
+contains
+
+  subroutine hello()
+
+    print*, 'o.k.'
+
+  end subroutine hello
+
+end module mo_x
@@ -0,0 +1,17 @@
+! Test of submodules: mo_shape.f90 has the interfaces, sm_shape.f90 a submodule
+! of mo_shape, and sm_detail.f90 a submodule of the submodule sm_shape. Nobody
+! uses the submodules; make check builds this directory with prune=true,
+! which must keep them.
+program submodule
+
+  use mo_shape, only: area, perimeter
+
+  implicit none
+
+  if ((area(2.0) == 4.0) .and. (perimeter(2.0) == 8.0)) then
+     print*, 'o.k.'
+  else
+     print*, 'failed'
+  endif
+
+end program submodule
@@ -0,0 +1,24 @@
+module mo_shape
+
+  implicit none
+
+  private
+
+  public :: area
+  public :: perimeter
+
+  interface
+
+     module function area(a)
+       real, intent(in) :: a
+       real :: area
+     end function area
+
+     module function perimeter(a)
+       real, intent(in) :: a
+       real :: perimeter
+     end function perimeter
+
+  end interface
+
+end module mo_shape
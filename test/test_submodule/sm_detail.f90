@@ -0,0 +1,16 @@
+submodule (mo_shape:sm_shape) sm_detail
+
+  implicit none
+
+contains
+
+  module function perimeter(a)
+
+    real, intent(in) :: a
+    real :: perimeter
+
+    perimeter = real(nsides()) * a
+
+  end function perimeter
+
+end submodule sm_detail
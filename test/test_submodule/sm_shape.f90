@@ -0,0 +1,25 @@
+submodule (mo_shape) sm_shape
+
+  implicit none
+
+contains
+
+  module function area(a)
+
+    real, intent(in) :: a
+    real :: area
+
+    area = a * a
+
+  end function area
+
+  ! accessible in the descendant sm_detail
+  function nsides()
+
+    integer :: nsides
+
+    nsides = 4
+
+  end function nsides
+
+end submodule sm_shape